@@ -1,51 +1,142 @@
+import os
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from utils.logger import get_logger
+from utils import metrics
+from domains.order_schema import ORDER_SCHEMA, SchemaValidationError
+from services.repositories.idempotency_repository import (
+    IdempotencyConflictError, IdempotencyKeyReusedError, request_fingerprint
+)
+
+logger = get_logger('order_domain')
+
+_speculation_pool = None
+
+def _get_speculation_pool():
+    """small shared pool for lookups that run while the jwt is being verified"""
+    global _speculation_pool
+    if _speculation_pool is None:
+        _speculation_pool = ThreadPoolExecutor(
+            max_workers=int(os.environ.get('SPECULATIVE_POOL_SIZE', '4')),
+            thread_name_prefix='speculative-lookup'
+        )
+    return _speculation_pool
+
 class OrderDomain:
     """
     domain for order-related business logic
     handles jwt validation and order operations
     """
     
-    def __init__(self, order_repository, jwt_service):
+    def __init__(self, order_repository, jwt_service, speculative=None, idempotency_repository=None):
         """
         initialize order domain
         
         args:
             order_repository: instance of OrderRepository
             jwt_service: instance of JWTService
+            speculative (bool, optional): overlap user lookup with jwt verification,
+                defaults to the SPECULATIVE_USER_LOOKUP env var
+            idempotency_repository (optional): instance of IdempotencyRepository, needed
+                for create_user_order_idempotently
         """
         self.order_repository = order_repository
         self.jwt_service = jwt_service
+        self.idempotency_repository = idempotency_repository
+        if speculative is None:
+            speculative = os.environ.get('SPECULATIVE_USER_LOOKUP', 'false').lower() == 'true'
+        self.speculative = speculative
+        self.batch_max_items = int(os.environ.get('ORDERS_BATCH_MAX_ITEMS', '100'))
     
-    def get_user_orders(self, id_token):
+    def get_user_orders(self, id_token, limit=None, cursor=None, newest_first=True,
+                        created_from=None, created_to=None, fields=None):
         """
-        get orders for user by validating their jwt token
+        get a page of orders for user by validating their jwt token
         
         args:
             id_token (str): cognito id token from authorization header
+            limit (int, optional): page size
+            cursor (str, optional): next_cursor from the previous page
+            newest_first (bool): newest orders first
+            created_from (datetime, optional): only orders created at/after this
+            created_to (datetime, optional): only orders created at/before this
+            fields (list, optional): order attributes to return (all when omitted)
             
         returns:
-            list: list of user's orders
+            dict: {'orders': [...], 'next_cursor': str or none, 'etag': str}
             
         raises:
             ValueError: if token invalid or user not found
+            InvalidCursorError: if the cursor is invalid
         """
-        # validate jwt and extract user info
-        try:
-            user_info = self.jwt_service.extract_user_info(id_token)
-            cognito_sub = user_info['sub']
-        except ValueError as e:
-            raise ValueError(f"invalid token: {str(e)}")
+        def fetch_page(user):
+            return self.order_repository.get_orders_page(
+                user['PK'],
+                limit=limit,
+                cursor=cursor,
+                newest_first=newest_first,
+                created_from=created_from,
+                created_to=created_to,
+                fields=fields
+            )
         
-        # find user by cognito sub
-        user = self.order_repository.find_user_by_cognito_sub(cognito_sub)
-        if not user:
-            raise ValueError("user not found in system")
+        # validate jwt, find user by cognito sub and (speculatively) start the orders query
+        user, page = self._authenticate(id_token, follow_up=fetch_page)
         
-        user_id = user['PK']  # extract user_id
+        if page is None:
+            page = fetch_page(user)
+        
+        return page
+    
+    def get_user_orders_by_ids(self, id_token, order_ids, fields=None):
+        """
+        get specific orders of the user by validating their jwt token
+        
+        args:
+            id_token (str): cognito id token from authorization header
+            order_ids (list): order ids to fetch
+            fields (list, optional): order attributes to return (all when omitted)
+            
+        returns:
+            dict: {'orders': [...], 'not_found': [order ids], 'etag': str}, ids of
+            other users' orders count as not found
+            
+        raises:
+            ValueError: if token invalid or user not found
+        """
+        def fetch_orders(user):
+            return self.order_repository.get_orders_by_ids(user['PK'], order_ids, fields=fields)
+        
+        user, result = self._authenticate(id_token, follow_up=fetch_orders)
         
-        # get orders for this user
-        orders = self.order_repository.get_orders_by_user_id(user_id)
+        if result is None:
+            result = fetch_orders(user)
         
-        return orders
+        return result
+    
+    def get_user_order_summary(self, id_token):
+        """
+        get the user's order aggregates by validating their jwt token
+        
+        args:
+            id_token (str): cognito id token from authorization header
+            
+        returns:
+            dict: order_count, total_spend (currency -> amount), last_order_at, last_order_id
+            
+        raises:
+            ValueError: if token invalid or user not found
+        """
+        def fetch_summary(user):
+            return self.order_repository.get_order_summary(user['PK'])
+        
+        user, summary = self._authenticate(id_token, follow_up=fetch_summary)
+        
+        if summary is None:
+            summary = fetch_summary(user)
+        
+        return summary
     
     def create_user_order(self, id_token, order_data):
         """
@@ -53,63 +144,235 @@ class OrderDomain:
         
         args:
             id_token (str): cognito id token from authorization header
-            order_data (dict): order information (item_name, quantity, price_per_item)
+            order_data (dict): order information (item_name, quantity, price_per_item),
+                parsed with order_schema.loads so prices are Decimal
             
         returns:
             dict: created order item
             
         raises:
-            ValueError: if token invalid, user not found, or validation fails
+            SchemaValidationError: if validation fails (a ValueError)
+            ValueError: if token invalid or user not found
         """
-        # validate jwt and extract user info
-        try:
-            user_info = self.jwt_service.extract_user_info(id_token)
-            cognito_sub = user_info['sub']
-        except ValueError as e:
-            raise ValueError(f"invalid token: {str(e)}")
-        
-        # find user by cognito sub
-        user = self.order_repository.find_user_by_cognito_sub(cognito_sub)
-        if not user:
-            raise ValueError("user not found in system")
+        # validate jwt and find user by cognito sub (writes never run speculatively)
+        user, _ = self._authenticate(id_token)
         
         user_id = user['PK']  # extract user_id
         
         # validate order data
-        self._validate_order_data(order_data)
+        order_fields = self._validate_order_data(order_data)
         
         # create order
-        order_item = self.order_repository.create_order(user_id, order_data)
+        order_item = self.order_repository.create_order(user_id, order_fields)
         if not order_item:
             raise ValueError("failed to create order")
         
         return order_item
     
-    def _validate_order_data(self, order_data):
+    def create_user_order_idempotently(self, id_token, order_data, idempotency_key):
         """
-        validate order data before creation
+        create_user_order for requests carrying an Idempotency-Key: the first request
+        with a key creates the order, retries with the same key and body get that order
+        back (one GetItem, no user lookup) instead of creating another one
         
         args:
-            order_data (dict): order information to validate
+            id_token (str): cognito id token from authorization header
+            order_data (dict): order information, parsed with order_schema.loads
+            idempotency_key (str): client-chosen key, validated by the handler
+            
+        returns:
+            tuple: (order item, true if it was created by an earlier request)
             
         raises:
-            ValueError: if validation fails
+            IdempotencyConflictError: if a request with this key is still in progress
+            IdempotencyKeyReusedError: if the key was used with a different body
+            SchemaValidationError: if validation fails
+            ValueError: if token invalid or user not found
         """
-        required_fields = ['item_name', 'quantity', 'price_per_item']
+        cognito_sub = self._verify_token(id_token)
+        fingerprint = request_fingerprint(order_data)
+        
+        record = self.idempotency_repository.get(cognito_sub, idempotency_key)
+        if record and not record['expired']:
+            return self._replay(record, fingerprint), True
+        
+        user = self._find_user(cognito_sub)
+        order_fields = self._validate_order_data(order_data)
         
-        # check required fields
-        for field in required_fields:
-            if field not in order_data:
-                raise ValueError(f"missing required field: {field}")
+        order_item = None
+        if record and record['status'] == 'in_progress' and record['fingerprint'] == fingerprint:
+            # an earlier attempt died after claiming the key; if its order made it, finish that one
+            order_item = self.order_repository.get_order(user['PK'], record['order']['order_id'])
+        already_written = order_item is not None
+        if order_item is None:
+            order_item = self.order_repository.new_order_item(user['PK'], order_fields)
         
-        # validate item name
-        if not order_data['item_name'].strip():
-            raise ValueError("item_name cannot be empty")
+        if not self.idempotency_repository.claim(cognito_sub, idempotency_key, fingerprint, order_item):
+            # another request claimed it between our read and our write
+            record = self.idempotency_repository.get(cognito_sub, idempotency_key)
+            if record and not record['expired']:
+                return self._replay(record, fingerprint), True
+            raise IdempotencyConflictError("a request with this Idempotency-Key is already in progress")
         
-        # validate quantity
-        if not isinstance(order_data['quantity'], int) or order_data['quantity'] <= 0:
-            raise ValueError("quantity must be a positive integer")
+        if not already_written:
+            try:
+                written = self.order_repository.save_order(order_item)
+            except Exception:
+                self.idempotency_repository.release(cognito_sub, idempotency_key, order_item)
+                raise
+            if not written:
+                self.idempotency_repository.release(cognito_sub, idempotency_key, order_item)
+                raise ValueError("failed to create order")
         
-        # validate price
-        if not isinstance(order_data['price_per_item'], (int, float)) or order_data['price_per_item'] <= 0:
-            raise ValueError("price_per_item must be a positive number") 
\ No newline at end of file
+        self.idempotency_repository.complete(cognito_sub, idempotency_key, fingerprint, order_item)
+        return order_item, False
+    
+    def _replay(self, record, fingerprint):
+        """the stored order of a live idempotency record, if it answers this request"""
+        if record['fingerprint'] != fingerprint:
+            raise IdempotencyKeyReusedError("Idempotency-Key was already used with a different request body")
+        if record['status'] != 'completed':
+            raise IdempotencyConflictError("a request with this Idempotency-Key is already in progress")
+        return record['order']
+    
+    def create_user_orders(self, id_token, orders_data):
+        """
+        create many orders for user with one token check and one user lookup
+        
+        args:
+            id_token (str): cognito id token from authorization header
+            orders_data (list): order information dicts (item_name, quantity, price_per_item)
+            
+        returns:
+            list: one result per input order, in input order:
+                {'index': i, 'success': True, 'order': order item} or
+                {'index': i, 'success': False, 'error': message, 'errors': [...] (validation only)}
+            
+        raises:
+            ValueError: if the batch is malformed or too big, token invalid or user not found
+        """
+        if not isinstance(orders_data, list) or not orders_data:
+            raise ValueError("orders must be a non-empty list")
+        if len(orders_data) > self.batch_max_items:
+            raise ValueError(f"at most {self.batch_max_items} orders per batch")
+        
+        user, _ = self._authenticate(id_token)
+        
+        results = [None] * len(orders_data)
+        valid = []
+        for index, order_data in enumerate(orders_data):
+            try:
+                valid.append((index, self._validate_order_data(order_data)))
+            except SchemaValidationError as e:
+                results[index] = {'index': index, 'success': False, 'error': str(e), 'errors': e.errors}
+        
+        if valid:
+            created = self.order_repository.create_orders(user['PK'], [order_fields for _, order_fields in valid])
+            for (index, _), (order_item, written) in zip(valid, created):
+                if written:
+                    results[index] = {'index': index, 'success': True, 'order': order_item}
+                else:
+                    results[index] = {'index': index, 'success': False, 'error': "failed to create order"}
+        
+        return results
+    
+    def _authenticate(self, id_token, follow_up=None):
+        """
+        verify the token and resolve the user it belongs to
+        
+        args:
+            id_token (str): cognito id token
+            follow_up (callable, optional): read-only work on the user, run
+                speculatively next to verification when speculative mode is on
+            
+        returns:
+            tuple: (user item, follow_up result or none if it didn't run)
+            
+        raises:
+            ValueError: if token invalid or user not found
+        """
+        if self.speculative:
+            return self._authenticate_speculatively(id_token, follow_up)
+        
+        cognito_sub = self._verify_token(id_token)
+        return self._find_user(cognito_sub), None
+    
+    def _verify_token(self, id_token):
+        """validate jwt and return the verified cognito sub"""
+        try:
+            user_info = self.jwt_service.extract_user_info(id_token)
+            return user_info['sub']
+        except ValueError as e:
+            raise ValueError(f"invalid token: {str(e)}")
+    
+    def _find_user(self, cognito_sub):
+        """find user by cognito sub"""
+        user = self.order_repository.find_user_by_cognito_sub(cognito_sub)
+        if not user:
+            raise ValueError("user not found in system")
+        return user
+    
+    def _authenticate_speculatively(self, id_token, follow_up=None):
+        """
+        start the user lookup (and follow-up) from the unverified sub on a worker
+        thread while the rs256 check runs here. results are only released when
+        verification succeeds and the verified sub matches the one we guessed.
+        only tokens that pass every unsigned check get a lookup, and it never scans
+        """
+        unverified_sub = self.jwt_service.get_plausible_sub(id_token)
+        if not unverified_sub:
+            return self._find_user(self._verify_token(id_token)), None
+        
+        def lookup():
+            started = time.perf_counter()
+            user = self.order_repository.find_user_by_cognito_sub(unverified_sub, allow_scan=False)
+            result = follow_up(user) if user and follow_up else None
+            return user, result, (time.perf_counter() - started) * 1000
+        
+        pipeline_started = time.perf_counter()
+        # copy the request context so the worker's stage timers land on this request
+        future = _get_speculation_pool().submit(contextvars.copy_context().run, lookup)
+        
+        try:
+            cognito_sub = self._verify_token(id_token)
+        except ValueError:
+            future.cancel()  # whatever it fetched is thrown away
+            raise
+        verify_ms = (time.perf_counter() - pipeline_started) * 1000
+        
+        if cognito_sub != unverified_sub:
+            # can't happen with a validly signed token, but never hand out someone else's data
+            future.cancel()
+            return self._find_user(cognito_sub), None
+        
+        user, result, lookup_ms = future.result()
+        total_ms = (time.perf_counter() - pipeline_started) * 1000
+        saved_ms = verify_ms + lookup_ms - total_ms
+        metrics.record('speculative_saved', saved_ms)
+        logger.debug(
+            "speculative pipeline",
+            verify_ms=round(verify_ms, 2),
+            lookup_ms=round(lookup_ms, 2),
+            total_ms=round(total_ms, 2),
+            saved_ms=round(saved_ms, 2)
+        )
+        
+        if not user:
+            # verified now, so the full lookup (scan fallback included) may run
+            return self._find_user(cognito_sub), None
+        return user, result
+    
+    def _validate_order_data(self, order_data):
+        """
+        validate order data before creation (every error at once, numbers as Decimal)
+        
+        args:
+            order_data (dict): order information to validate
+            
+        returns:
+            dict: item_name, quantity, price_per_item and total_price, ready to write
+            
+        raises:
+            SchemaValidationError: if validation fails (a ValueError, .errors has the details)
+        """
+        return ORDER_SCHEMA.validate(order_data)
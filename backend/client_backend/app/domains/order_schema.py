@@ -0,0 +1,153 @@
+import json
+from decimal import Context, Decimal
+
+# order payload schema, compiled once at import: every field rule is a small function,
+# validate() runs them all in one pass and reports every problem together. numbers are
+# parsed as Decimal (never float), so what comes out is ready to write to dynamodb
+
+# dynamodb numbers: at most 38 significant digits, magnitude 1E-130 .. 9.99..E+125
+MAX_NUMBER_DIGITS = 38
+# wide enough that multiplying two in-range numbers is exact
+_EXACT = Context(prec=2 * MAX_NUMBER_DIGITS)
+
+
+class SchemaValidationError(ValueError):
+    """payload failed validation; .errors lists every problem as {'field': ..., 'message': ...}"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(error['message'] for error in errors))
+
+
+def loads(body):
+    """
+    parse a json request body for validation
+
+    args:
+        body (str): raw request body
+
+    returns:
+        parsed json, with fractional numbers as Decimal (NaN/Infinity too, so they fail validation)
+
+    raises:
+        json.JSONDecodeError: if the body isn't json
+    """
+    return json.loads(body, parse_float=Decimal, parse_constant=Decimal)
+
+
+def _out_of_range(number):
+    """would dynamodb reject this number?"""
+    return len(number.as_tuple().digits) > MAX_NUMBER_DIGITS or not -130 <= number.adjusted() <= 125
+
+
+def string(name):
+    """rule: non-blank string, kept as sent"""
+    def check(value):
+        if not isinstance(value, str):
+            return None, f"{name} must be a string"
+        if not value.strip():
+            return None, f"{name} cannot be empty"
+        return value, None
+    return check
+
+
+def positive_integer(name):
+    """rule: whole number > 0 (no bools, no 3.0)"""
+    message = f"{name} must be a positive integer"
+
+    def check(value):
+        if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+            return None, message
+        if _out_of_range(Decimal(value)):
+            return None, f"{name} is out of range"
+        return value, None
+    return check
+
+
+def positive_decimal(name):
+    """rule: finite number > 0, returned as Decimal"""
+    message = f"{name} must be a positive number"
+
+    def check(value):
+        if isinstance(value, bool) or not isinstance(value, (int, Decimal)):
+            return None, message
+        number = Decimal(value)
+        if not number.is_finite() or number <= 0:
+            return None, message
+        if _out_of_range(number):
+            return None, f"{name} is out of range"
+        return number, None
+    return check
+
+
+class CompiledSchema:
+    """
+    schema = CompiledSchema({'name': string('name'), ...}, derive=fn)
+    clean = schema.validate(payload)  # or SchemaValidationError with all errors
+    """
+
+    def __init__(self, rules, derive=None):
+        """
+        args:
+            rules (dict): field name -> rule function (all fields required)
+            derive (callable, optional): clean fields -> extra fields (e.g. totals),
+                may return a (field, message) error instead of raising
+        """
+        self._rules = tuple(rules.items())
+        self._derive = derive
+
+    def validate(self, data):
+        """
+        check and coerce a payload in one pass
+
+        args:
+            data: parsed json payload (fields not in the schema are ignored)
+
+        returns:
+            dict: the schema's fields, coerced, plus derived fields
+
+        raises:
+            SchemaValidationError: with every error found
+        """
+        if not isinstance(data, dict):
+            raise SchemaValidationError([{'field': None, 'message': "order must be an object"}])
+
+        clean = {}
+        errors = []
+        for name, check in self._rules:
+            if name not in data:
+                errors.append({'field': name, 'message': f"missing required field: {name}"})
+                continue
+            value, error = check(data[name])
+            if error:
+                errors.append({'field': name, 'message': error})
+            else:
+                clean[name] = value
+
+        if errors:
+            raise SchemaValidationError(errors)
+
+        if self._derive:
+            derived, error = self._derive(clean)
+            if error:
+                raise SchemaValidationError([{'field': error[0], 'message': error[1]}])
+            clean.update(derived)
+        return clean
+
+
+def _order_totals(clean):
+    """exact total, Decimal * int"""
+    total_price = _EXACT.multiply(clean['price_per_item'], Decimal(clean['quantity']))
+    if _out_of_range(total_price):
+        return None, ('total_price', "total_price is out of range")
+    return {'total_price': total_price}, None
+
+
+ORDER_SCHEMA = CompiledSchema(
+    {
+        'item_name': string('item_name'),
+        'quantity': positive_integer('quantity'),
+        'price_per_item': positive_decimal('price_per_item')
+    },
+    derive=_order_totals
+)
@@ -5,22 +5,28 @@ import sys
 # Add the parent directory to sys.path to allow importing from app modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from services.aws.dynamodb_service import DynamoDBService
-from services.repositories.order_repository import OrderRepository
-from services.auth.jwt_service import JWTService
-from domains.order_domain import OrderDomain
-from utils.response_formatter import success_response, error_response
+from services import container
+from domains.order_schema import SchemaValidationError, loads
+from services.aws.dynamodb_resilience import RETRYABLE_ERRORS
+from services.repositories.idempotency_repository import (
+    IdempotencyConflictError, IdempotencyKeyReusedError, validate_idempotency_key
+)
+from utils.response_formatter import success_response, error_response, dynamodb_error_response
+from utils.logger import get_logger
+from utils.metrics import instrumented
 
-# Initialize services and repositories
-dynamodb_service = DynamoDBService()
-order_repository = OrderRepository(dynamodb_service)
-jwt_service = JWTService()
-order_domain = OrderDomain(order_repository, jwt_service)
+# Services are shared per container and built on first use (or now, with PRIME_ON_INIT=true)
+container.prime_if_enabled()
 
+logger = get_logger('create_order')
+
+@instrumented('create_order')
 def handler(event, context):
     """
     HTTP Handler for POST /orders
     Creates a new order for authenticated user
+    With an Idempotency-Key header, retries of the request get the same order back
+    (Idempotent-Replayed: true) instead of creating another one
     
     Args:
         event: API Gateway event containing headers and body
@@ -30,8 +36,6 @@ def handler(event, context):
         API Gateway response with created order details
     """
     try:
-        print("Create order request received:", json.dumps(event))
-        
         # Extract Authorization header
         headers = event.get('headers') or {}
         auth_header = headers.get('Authorization') or headers.get('authorization')
@@ -46,6 +50,18 @@ def handler(event, context):
         # Extract ID token (remove 'Bearer ' prefix if present)
         id_token = auth_header.replace('Bearer ', '') if auth_header.startswith('Bearer ') else auth_header
         
+        # Optional Idempotency-Key (client-chosen, e.g. a uuid per logical order)
+        idempotency_key = headers.get('Idempotency-Key') or headers.get('idempotency-key')
+        if idempotency_key is not None:
+            try:
+                validate_idempotency_key(idempotency_key)
+            except ValueError as e:
+                return error_response(
+                    status_code=400,
+                    message=str(e),
+                    error_code="INVALID_IDEMPOTENCY_KEY"
+                )
+        
         # Extract request body
         body = event.get('body')
         if not body:
@@ -55,9 +71,9 @@ def handler(event, context):
                 error_code="MISSING_BODY"
             )
         
-        # Parse JSON body
+        # Parse JSON body (prices straight to Decimal)
         try:
-            order_data = json.loads(body)
+            order_data = loads(body)
         except json.JSONDecodeError:
             return error_response(
                 status_code=400,
@@ -67,7 +83,32 @@ def handler(event, context):
         
         # Create order using domain layer
         try:
-            order_item = order_domain.create_user_order(id_token, order_data)
+            if idempotency_key:
+                order_item, replayed = container.get_order_domain().create_user_order_idempotently(
+                    id_token, order_data, idempotency_key
+                )
+            else:
+                order_item, replayed = container.get_order_domain().create_user_order(id_token, order_data), False
+        except IdempotencyConflictError as e:
+            return error_response(
+                status_code=409,
+                message=str(e),
+                error_code="IDEMPOTENCY_CONFLICT",
+                headers={'Retry-After': '1'}
+            )
+        except IdempotencyKeyReusedError as e:
+            return error_response(
+                status_code=422,
+                message=str(e),
+                error_code="IDEMPOTENCY_KEY_REUSED"
+            )
+        except SchemaValidationError as e:
+            return error_response(
+                status_code=400,
+                message=str(e),
+                error_code="ORDER_CREATION_FAILED",
+                errors=e.errors
+            )
         except ValueError as e:
             return error_response(
                 status_code=400,
@@ -75,24 +116,29 @@ def handler(event, context):
                 error_code="ORDER_CREATION_FAILED"
             )
         
-        # Return success response
+        # Return success response (decimals are converted while serializing)
         return success_response(
             data={
                 "order_id": order_item['order_id'],
                 "user_id": order_item['user_id'],
                 "item_name": order_item['item_name'],
                 "quantity": order_item['quantity'],
-                "price_per_item": float(order_item['price_per_item']),
-                "total_price": float(order_item['total_price']),
+                "price_per_item": order_item['price_per_item'],
+                "total_price": order_item['total_price'],
                 "currency": order_item['currency'],
                 "status": order_item['status'],
                 "created_at": order_item['created_at']
             },
-            message="Order created successfully"
+            message="Order created successfully",
+            headers={'Idempotent-Replayed': 'true'} if replayed else None,
+            request_headers=headers
         )
         
+    except RETRYABLE_ERRORS as e:
+        return dynamodb_error_response(e)
+        
     except Exception as e:
-        print(f"Error in create order handler: {str(e)}")
+        logger.error("Error in create order handler: %s", e)
         return error_response(
             status_code=500,
             message="Internal server error",
@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+
+# Add the parent directory to sys.path to allow importing from app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services import container
+from domains.order_schema import loads
+from services.aws.dynamodb_resilience import RETRYABLE_ERRORS
+from utils.response_formatter import success_response, error_response, dynamodb_error_response
+from utils.logger import get_logger
+from utils.metrics import instrumented
+
+# Services are shared per container and built on first use (or now, with PRIME_ON_INIT=true)
+container.prime_if_enabled()
+
+logger = get_logger('create_orders_batch')
+
+def order_response(order_item):
+    """public fields of a created order (same shape as POST /orders returns)"""
+    return {
+        "order_id": order_item['order_id'],
+        "user_id": order_item['user_id'],
+        "item_name": order_item['item_name'],
+        "quantity": order_item['quantity'],
+        "price_per_item": order_item['price_per_item'],
+        "total_price": order_item['total_price'],
+        "currency": order_item['currency'],
+        "status": order_item['status'],
+        "created_at": order_item['created_at']
+    }
+
+@instrumented('create_orders_batch')
+def handler(event, context):
+    """
+    HTTP Handler for POST /orders/batch
+    Creates many orders for authenticated user: body {"orders": [{item_name, quantity, price_per_item}, ...]}
+    Every order gets its own result, invalid or unwritten orders don't fail the others
+
+    Args:
+        event: API Gateway event containing headers and body
+        context: Lambda context
+
+    Returns:
+        API Gateway response with one result per order, in request order
+    """
+    try:
+        # Extract Authorization header
+        headers = event.get('headers') or {}
+        auth_header = headers.get('Authorization') or headers.get('authorization')
+
+        if not auth_header:
+            return error_response(
+                status_code=401,
+                message="Missing Authorization header",
+                error_code="MISSING_AUTH_HEADER"
+            )
+
+        # Extract ID token (remove 'Bearer ' prefix if present)
+        id_token = auth_header.replace('Bearer ', '') if auth_header.startswith('Bearer ') else auth_header
+
+        # Extract request body
+        body = event.get('body')
+        if not body:
+            return error_response(
+                status_code=400,
+                message="Missing request body",
+                error_code="MISSING_BODY"
+            )
+
+        # Parse JSON body (prices straight to Decimal)
+        try:
+            payload = loads(body)
+        except json.JSONDecodeError:
+            return error_response(
+                status_code=400,
+                message="Invalid JSON in request body",
+                error_code="INVALID_JSON"
+            )
+
+        orders_data = payload.get('orders') if isinstance(payload, dict) else payload
+
+        # Create orders using domain layer
+        try:
+            results = container.get_order_domain().create_user_orders(id_token, orders_data)
+        except ValueError as e:
+            return error_response(
+                status_code=400,
+                message=str(e),
+                error_code="ORDER_CREATION_FAILED"
+            )
+
+        created_count = sum(1 for result in results if result['success'])
+
+        # Return per-order results (decimals are converted while serializing)
+        return success_response(
+            data={
+                "results": [
+                    {"index": result['index'], "success": True, "order": order_response(result['order'])}
+                    if result['success'] else result
+                    for result in results
+                ],
+                "created_count": created_count,
+                "failed_count": len(results) - created_count
+            },
+            message=f"Created {created_count} of {len(results)} orders",
+            request_headers=headers
+        )
+
+    except RETRYABLE_ERRORS as e:
+        return dynamodb_error_response(e)
+        
+    except Exception as e:
+        logger.error("Error in create orders batch handler: %s", e)
+        return error_response(
+            status_code=500,
+            message="Internal server error",
+            error_code="INTERNAL_ERROR"
+        )
@@ -0,0 +1,73 @@
+import os
+import sys
+
+# Add the parent directory to sys.path to allow importing from app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services import container
+from services.aws.dynamodb_resilience import RETRYABLE_ERRORS
+from utils.response_formatter import success_response, error_response, dynamodb_error_response
+from utils.logger import get_logger
+from utils.metrics import instrumented
+
+# Services are shared per container and built on first use (or now, with PRIME_ON_INIT=true)
+container.prime_if_enabled()
+
+logger = get_logger('get_order_summary')
+
+@instrumented('get_order_summary')
+def handler(event, context):
+    """
+    HTTP Handler for GET /orders/summary
+    Returns the authenticated user's order count, total spend per currency and last order,
+    read from the summary item kept up to date on every order write (one GetItem)
+    
+    Args:
+        event: API Gateway event containing headers
+        context: Lambda context
+        
+    Returns:
+        API Gateway response with the user's order summary
+    """
+    try:
+        # Extract Authorization header
+        headers = event.get('headers') or {}
+        auth_header = headers.get('Authorization') or headers.get('authorization')
+        
+        if not auth_header:
+            return error_response(
+                status_code=401,
+                message="Missing Authorization header",
+                error_code="MISSING_AUTH_HEADER"
+            )
+        
+        # Extract ID token (remove 'Bearer ' prefix if present)
+        id_token = auth_header.replace('Bearer ', '') if auth_header.startswith('Bearer ') else auth_header
+        
+        # Get order summary using domain layer
+        try:
+            summary = container.get_order_domain().get_user_order_summary(id_token)
+        except ValueError as e:
+            return error_response(
+                status_code=401,
+                message=str(e),
+                error_code="UNAUTHORIZED"
+            )
+        
+        # decimals are converted while the response is serialized
+        return success_response(
+            data=summary,
+            message="Order summary retrieved successfully",
+            request_headers=headers
+        )
+        
+    except RETRYABLE_ERRORS as e:
+        return dynamodb_error_response(e)
+        
+    except Exception as e:
+        logger.error("Error in get order summary handler: %s", e)
+        return error_response(
+            status_code=500,
+            message="Internal server error",
+            error_code="INTERNAL_ERROR"
+        )
@@ -1,51 +1,144 @@
-import json
 import os
 import sys
-from decimal import Decimal
 
 # Add the parent directory to sys.path to allow importing from app modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from services.aws.dynamodb_service import DynamoDBService
-from services.repositories.order_repository import OrderRepository
-from services.auth.jwt_service import JWTService
-from domains.order_domain import OrderDomain
-from utils.response_formatter import success_response, error_response
+from services import container
+from services.aws.dynamodb_resilience import RETRYABLE_ERRORS
+from utils.response_formatter import success_response, error_response, not_modified_response, etag_matches, dynamodb_error_response
+from utils.logger import get_logger
+from utils.metrics import instrumented
+from utils.cursor_codec import InvalidCursorError
+from utils.order_ids import parse_date_bound, is_order_id
+from services.repositories.order_repository import SELECTABLE_ORDER_FIELDS
 
-# Initialize services and repositories
-dynamodb_service = DynamoDBService()
-order_repository = OrderRepository(dynamodb_service)
-jwt_service = JWTService()
-order_domain = OrderDomain(order_repository, jwt_service)
+# Services are shared per container and built on first use (or now, with PRIME_ON_INIT=true)
+container.prime_if_enabled()
 
-def convert_decimal_to_float(obj):
+logger = get_logger('get_orders')
+
+# most ids one ?ids= request may ask for (fetched 100 per BatchGetItem, in parallel)
+MAX_IDS = int(os.environ.get('ORDERS_MAX_IDS', '300'))
+
+# clients may keep the page but must revalidate it (If-None-Match) before using it
+CACHE_HEADERS = {'Cache-Control': 'private, no-cache'}
+
+def parse_page_params(query_params):
+    """
+    read pagination options from the query string
+    
+    args:
+        query_params (dict): api gateway queryStringParameters
+        
+    returns:
+        dict: limit, cursor, newest_first, date range and fields for the domain layer
+        
+    raises:
+        ValueError: if a parameter is invalid
+    """
+    limit = query_params.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or int(limit) <= 0:
+            raise ValueError("limit must be a positive integer")
+        limit = int(limit)
+    
+    order = query_params.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be asc or desc")
+    
+    # date-only `to` covers the whole day
+    created_from = query_params.get('from')
+    created_to = query_params.get('to')
+    if created_from:
+        created_from = parse_date_bound(created_from)
+    if created_to:
+        created_to = parse_date_bound(created_to, end_of_day=True)
+    if created_from and created_to and (created_from.tzinfo is None) != (created_to.tzinfo is None):
+        raise ValueError("from and to must both include a timezone or both omit it")
+    if created_from and created_to and created_from > created_to:
+        raise ValueError("from must not be after to")
+    
+    return {
+        'limit': limit,
+        'cursor': query_params.get('cursor'),
+        'newest_first': order == 'desc',
+        'created_from': created_from or None,
+        'created_to': created_to or None,
+        'fields': parse_fields(query_params)
+    }
+
+def parse_fields(query_params):
+    """
+    sparse fieldset, e.g. ?fields=order_id,item_name,total_price,status
+    
+    returns:
+        list: requested order attributes, or none for all of them
+        
+    raises:
+        ValueError: if a field isn't selectable
+    """
+    fields = query_params.get('fields')
+    if fields is None:
+        return None
+    
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in SELECTABLE_ORDER_FIELDS]
+    if not fields or unknown:
+        raise ValueError(
+            f"fields must be a comma separated list of: {', '.join(SELECTABLE_ORDER_FIELDS)}"
+        )
+    return fields
+
+def parse_ids_params(query_params):
     """
-    recursively convert decimal objects to float for json serialization
+    read ?ids=a,b,c (specific orders instead of a page)
+    
+    args:
+        query_params (dict): api gateway queryStringParameters
+        
+    returns:
+        dict: order_ids and fields for the domain layer
+        
+    raises:
+        ValueError: if the ids are invalid or combined with paging options
     """
-    if isinstance(obj, list):
-        return [convert_decimal_to_float(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {key: convert_decimal_to_float(value) for key, value in obj.items()}
-    elif isinstance(obj, Decimal):
-        return float(obj)
-    else:
-        return obj
+    paging = [name for name in ('limit', 'cursor', 'order', 'from', 'to') if name in query_params]
+    if paging:
+        raise ValueError(f"ids can't be combined with: {', '.join(paging)}")
+    
+    order_ids = list(dict.fromkeys(value.strip() for value in query_params['ids'].split(',') if value.strip()))
+    if not order_ids:
+        raise ValueError("ids must be a comma separated list of order ids")
+    if len(order_ids) > MAX_IDS:
+        raise ValueError(f"at most {MAX_IDS} ids per request")
+    invalid = [order_id for order_id in order_ids if not is_order_id(order_id)]
+    if invalid:
+        raise ValueError(f"invalid order id: {invalid[0]}")
+    
+    return {
+        'order_ids': order_ids,
+        'fields': parse_fields(query_params)
+    }
 
+@instrumented('get_orders')
 def handler(event, context):
     """
     HTTP Handler for GET /orders
-    Returns all orders for authenticated user
+    Returns a page of orders for authenticated user
+    Query params: limit, cursor (next_cursor of the previous page), order (desc|asc),
+    from / to (iso date or datetime, inclusive), fields (comma separated order attributes);
+    or ids (comma separated order ids) to fetch specific orders instead of a page
+    Sends an ETag; a matching If-None-Match gets 304 Not Modified without a body
     
     Args:
         event: API Gateway event containing headers
         context: Lambda context
         
     Returns:
-        API Gateway response with user's orders
+        API Gateway response with user's orders and next_cursor
     """
     try:
-        print("Get orders request received:", json.dumps(event))
-        
         # Extract Authorization header
         headers = event.get('headers') or {}
         auth_header = headers.get('Authorization') or headers.get('authorization')
@@ -60,9 +153,33 @@ def handler(event, context):
         # Extract ID token (remove 'Bearer ' prefix if present)
         id_token = auth_header.replace('Bearer ', '') if auth_header.startswith('Bearer ') else auth_header
         
+        # Parse pagination params (or the ids to fetch)
+        query_params = event.get('queryStringParameters') or {}
+        try:
+            if 'ids' in query_params:
+                ids_params = parse_ids_params(query_params)
+            else:
+                ids_params = None
+                page_params = parse_page_params(query_params)
+        except ValueError as e:
+            return error_response(
+                status_code=400,
+                message=str(e),
+                error_code="INVALID_QUERY_PARAMS"
+            )
+        
         # Get user orders using domain layer
         try:
-            orders = order_domain.get_user_orders(id_token)
+            if ids_params:
+                page = container.get_order_domain().get_user_orders_by_ids(id_token, **ids_params)
+            else:
+                page = container.get_order_domain().get_user_orders(id_token, **page_params)
+        except InvalidCursorError as e:
+            return error_response(
+                status_code=400,
+                message=str(e),
+                error_code="INVALID_CURSOR"
+            )
         except ValueError as e:
             return error_response(
                 status_code=401,
@@ -70,19 +187,32 @@ def handler(event, context):
                 error_code="UNAUTHORIZED"
             )
         
-        # convert decimal objects to float for json serialization
-        orders_serializable = convert_decimal_to_float(orders)
+        # the client already has this page
+        if etag_matches(headers.get('If-None-Match') or headers.get('if-none-match'), page['etag']):
+            return not_modified_response(page['etag'], headers=CACHE_HEADERS, request_headers=headers)
         
+        data = {
+            "orders": page['orders'],
+            "total_orders": len(page['orders'])
+        }
+        if ids_params:
+            data["not_found"] = page['not_found']
+        else:
+            data["next_cursor"] = page['next_cursor']
+        
+        # decimals are converted while the response is serialized
         return success_response(
-            data={
-                "orders": orders_serializable,
-                "total_orders": len(orders_serializable)
-            },
-            message="Orders retrieved successfully"
+            data=data,
+            message="Orders retrieved successfully",
+            headers=dict(CACHE_HEADERS, ETag=page['etag']),
+            request_headers=headers
         )
         
+    except RETRYABLE_ERRORS as e:
+        return dynamodb_error_response(e)
+        
     except Exception as e:
-        print(f"Error in get orders handler: {str(e)}")
+        logger.error("Error in get orders handler: %s", e)
         return error_response(
             status_code=500,
             message="Internal server error",
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import urllib.request
+from utils.logger import get_logger
+
+logger = get_logger('jwks_key_store')
+
+class JWKSKeyStore:
+    """
+    kid-indexed store for cognito's public keys
+    keeps the jwks fresh (ttl), refreshes in the background when stale,
+    and only re-downloads for an unknown kid once per cooldown window
+    """
+
+    def __init__(self, jwks_url, ttl_seconds=3600, refresh_cooldown_seconds=30,
+                 cache_path=None, timeout_seconds=3, key_loader=None):
+        """
+        initialize key store
+
+        args:
+            jwks_url (str): url of the jwks document (cognito or a local stand-in)
+            ttl_seconds (int): how long downloaded keys are considered fresh
+            refresh_cooldown_seconds (int): min gap between unknown-kid refreshes (and between
+                background refresh attempts, tracked separately)
+            cache_path (str, optional): file used to persist keys across containers (/tmp)
+            timeout_seconds (int): http timeout for the jwks download
+            key_loader (callable, optional): turns a jwk dict into a ready-to-use key object
+        """
+        self.jwks_url = jwks_url
+        self.ttl_seconds = ttl_seconds
+        self.refresh_cooldown_seconds = refresh_cooldown_seconds
+        self.cache_path = cache_path
+        self.timeout_seconds = timeout_seconds
+        self.key_loader = key_loader
+
+        self._jwks = {'keys': []}  # raw document, what we persist
+        self._keys = {}  # kid -> prepared key (or the jwk dict without a key_loader)
+        self._fetched_at = 0.0  # wall clock, so it survives /tmp round trips
+        self._last_refresh_attempt = 0.0  # any download, gates background (ttl) refreshes
+        self._last_unknown_kid_refresh = 0.0  # gates unknown-kid refreshes only
+        self._refresh_lock = threading.Lock()  # single-flight downloads
+        self._background_refresh = None
+
+        self._load_from_disk()
+
+    def get_key(self, kid):
+        """
+        get the public key for a kid
+
+        args:
+            kid (str): key id from the token header
+
+        returns:
+            matching key (prepared by key_loader, else the jwk dict)
+
+        raises:
+            ValueError: if no key exists for this kid
+        """
+        if not self._keys:
+            # nothing loaded yet (cold container, no /tmp copy) - must block
+            self.refresh()
+        elif self._is_stale():
+            # serve the keys we have and refresh behind the request
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+
+        # unknown kid: maybe cognito rotated keys, but don't let forged kids hammer the endpoint.
+        # its own cooldown, so a ttl refresh that just started doesn't lock out a rotated kid;
+        # refresh() waits for that in-flight download instead of starting another
+        if self._unknown_kid_cooldown_elapsed():
+            self._last_unknown_kid_refresh = time.time()
+            self.refresh()
+            key = self._keys.get(kid)
+            if key is not None:
+                return key
+
+        raise ValueError("can't find the key for this token - might be fake?")
+
+    def has_key(self, kid):
+        """is a key for this kid loaded? (never downloads)"""
+        return kid in self._keys
+
+    def get_jwks(self):
+        """return the current keys as a jwks document"""
+        if not self._keys:
+            self.refresh()
+        return self._jwks
+
+    def refresh(self):
+        """
+        download the jwks and swap in the new keys
+        concurrent callers wait for the in-flight download instead of starting their own
+        """
+        started_at = time.time()
+        with self._refresh_lock:
+            # someone else refreshed while we waited on the lock
+            if self._fetched_at >= started_at:
+                return
+
+            self._last_refresh_attempt = time.time()
+            logger.info("downloading public keys from: %s", self.jwks_url)
+            with urllib.request.urlopen(self.jwks_url, timeout=self.timeout_seconds) as response:
+                jwks = json.loads(response.read().decode('utf-8'))
+
+            self._set_keys(jwks, time.time())
+            self._save_to_disk(jwks)
+
+    def _set_keys(self, jwks, fetched_at):
+        """index keys by kid (parsing each one once) and replace the current set in one assignment"""
+        keys = {}
+        for jwk_dict in jwks.get('keys', []):
+            if 'kid' not in jwk_dict:
+                continue
+            try:
+                keys[jwk_dict['kid']] = self.key_loader(jwk_dict) if self.key_loader else jwk_dict
+            except Exception as e:
+                logger.warning("skipping unusable jwk %s: %s", jwk_dict['kid'], e)
+
+        self._jwks = jwks
+        self._keys = keys
+        self._fetched_at = fetched_at
+
+    def _is_stale(self):
+        """check if keys are past their ttl"""
+        return time.time() - self._fetched_at >= self.ttl_seconds
+
+    def _cooldown_elapsed(self):
+        """check if we're allowed another background refresh (failed ones aren't retried at once)"""
+        return time.time() - self._last_refresh_attempt >= self.refresh_cooldown_seconds
+
+    def _unknown_kid_cooldown_elapsed(self):
+        """check if we're allowed another unknown-kid refresh"""
+        return time.time() - self._last_unknown_kid_refresh >= self.refresh_cooldown_seconds
+
+    def _refresh_in_background(self):
+        """start a daemon thread to refresh stale keys (at most one at a time)"""
+        if self._background_refresh is not None and self._background_refresh.is_alive():
+            return
+        if not self._cooldown_elapsed():
+            return
+
+        self._background_refresh = threading.Thread(target=self._safe_refresh, daemon=True)
+        self._background_refresh.start()
+
+    def _safe_refresh(self):
+        """refresh without raising - failed background refreshes keep the old keys"""
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning("background jwks refresh failed: %s", e)
+
+    def _load_from_disk(self):
+        """load keys persisted by a previous container, if any"""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            self._set_keys(cached['jwks'], float(cached['fetched_at']))
+            logger.info("loaded %s public keys from %s", len(self._keys), self.cache_path)
+        except Exception as e:
+            logger.warning("ignoring unreadable jwks cache %s: %s", self.cache_path, e)
+
+    def _save_to_disk(self, jwks):
+        """persist keys atomically so a half-written file is never read"""
+        if not self.cache_path:
+            return
+
+        try:
+            cache_dir = os.path.dirname(self.cache_path) or '.'
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.jwks-')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'fetched_at': self._fetched_at, 'jwks': jwks}, f)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logger.warning("could not persist jwks to %s: %s", self.cache_path, e)
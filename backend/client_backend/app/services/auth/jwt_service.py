@@ -1,7 +1,15 @@
 import os
-import json
-import urllib.request
-from jose import jwt, JWTError
+import time
+import hashlib
+from services.auth.jwks_key_store import JWKSKeyStore
+from services.auth.token_verifiers import (
+    TokenVerificationError, create_verifier, get_unverified_claims, get_unverified_header, validate_claims
+)
+from utils.ttl_cache import TTLCache
+from utils.logger import get_logger
+from utils import metrics
+
+logger = get_logger('jwt_service')
 
 class JWTService:
     """
@@ -15,64 +23,125 @@ class JWTService:
         self.app_client_id = os.environ.get('COGNITO_APP_CLIENT_ID')
         self.region = os.environ.get('AWS_REGION', 'ap-southeast-2')
         
-        # this is cognito's "phone book" of public keys
-        self.jwks_url = f"https://cognito-idp.{self.region}.amazonaws.com/{self.user_pool_id}/.well-known/jwks.json"
-        self.jwks = None  # cache the keys so we don't download every time
-    
-    def _get_jwks(self):
-        """download the public keys from cognito (only once, then cache)"""
-        if self.jwks is None:
-            print(f"downloading public keys from: {self.jwks_url}")
-            # step 1: ask cognito for their public key directory
-            with urllib.request.urlopen(self.jwks_url) as response:
-                self.jwks = json.loads(response.read().decode('utf-8'))
-        return self.jwks
+        # this is cognito's "phone book" of public keys (overridable for local stand-ins)
+        self.jwks_url = os.environ.get(
+            'COGNITO_JWKS_URL',
+            f"https://cognito-idp.{self.region}.amazonaws.com/{self.user_pool_id}/.well-known/jwks.json"
+        )
+        
+        # cryptography when installed, python-jose otherwise (or forced via env)
+        self.verifier = create_verifier(os.environ.get('JWT_VERIFY_BACKEND', 'auto'))
+        self.issuer = f"https://cognito-idp.{self.region}.amazonaws.com/{self.user_pool_id}"
+        
+        # keys are indexed by kid, parsed into public key objects once per download,
+        # refreshed after the ttl and persisted to /tmp for warm restarts
+        self.key_store = JWKSKeyStore(
+            self.jwks_url,
+            ttl_seconds=int(os.environ.get('JWKS_TTL_SECONDS', '3600')),
+            refresh_cooldown_seconds=int(os.environ.get('JWKS_REFRESH_COOLDOWN_SECONDS', '30')),
+            cache_path=os.environ.get('JWKS_CACHE_PATH', f"/tmp/jwks-{self.user_pool_id}.json"),
+            key_loader=self.verifier.prepare_key
+        )
+        
+        # tokens we already verified -> their claims, so repeat requests skip the rsa math
+        self.clock_skew_seconds = int(os.environ.get('JWT_CLOCK_SKEW_SECONDS', '30'))
+        self.claims_cache = TTLCache(max_size=int(os.environ.get('JWT_CLAIMS_CACHE_SIZE', '1024')))
     
     def _get_key_for_token(self, token_header):
         """find which key cognito used to sign this specific token"""
-        jwks = self._get_jwks()
+        if 'kid' not in token_header:
+            raise ValueError("token header has no kid")
         
-        # step 2: look through all keys to find the one with matching kid
-        for key in jwks['keys']:
-            if key['kid'] == token_header['kid']:  # found it!
-                return key
-        
-        # step 3: if we get here, something's wrong
-        raise ValueError("can't find the key for this token - might be fake?")
+        # dict lookup by kid - unknown kids trigger (rate-limited) refresh inside the store
+        return self.key_store.get_key(token_header['kid'])
     
     def validate_id_token(self, id_token):
         """
         main function: verify if this jwt is real and extract user info
         this is like checking if a check is real using the bank's signature
         """
+        with metrics.stage('jwt_verify'):
+            return self._validate_id_token(id_token)
+    
+    def _validate_id_token(self, id_token):
+        """validate_id_token without the stage timer"""
+        # step 0: same token verified earlier on this container? reuse its claims
+        cache_key = hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+        cached_claims = self.claims_cache.get(cache_key)
+        if cached_claims is not None:
+            metrics.increment('jwt_claims_cache_hit')
+            return dict(cached_claims)
+        metrics.increment('jwt_claims_cache_miss')
+        
         try:
-            print("checking if this jwt token is legit...")
+            logger.debug("checking if this jwt token is legit...")
             
             # step 1: peek at jwt header to see which key was used
-            token_header = jwt.get_unverified_header(id_token)
+            token_header = get_unverified_header(id_token)
             
-            # step 2: get the matching public key from cognito
+            # step 2: get the matching (already parsed) public key from cognito
             key = self._get_key_for_token(token_header)
             
-            # step 3: verify the signature using rsa + sha256 magic
-            decoded_token = jwt.decode(
+            # step 3: verify the rs256 signature + audience/issuer/expiry
+            decoded_token = self.verifier.verify(
                 id_token,
                 key,
-                algorithms=['RS256'],  # only allow rs256
                 audience=self.app_client_id,  # make sure token is for our app
-                issuer=f"https://cognito-idp.{self.region}.amazonaws.com/{self.user_pool_id}"  # from our cognito
+                issuer=self.issuer  # from our cognito
             )
             
-            print(f"token is valid! user: {decoded_token.get('sub')}")
+            logger.debug("token is valid! user: %s", decoded_token.get('sub'))
+            self._cache_claims(cache_key, decoded_token)
             return decoded_token
             
-        except JWTError as e:
-            print(f"jwt verification failed: {str(e)}")
+        except TokenVerificationError as e:
+            logger.info("jwt verification failed: %s", e)
             raise ValueError(f"bad token: {str(e)}")
         except Exception as e:
-            print(f"something went wrong: {str(e)}")
+            logger.warning("something went wrong: %s", e)
             raise ValueError(f"token check failed: {str(e)}")
     
+    def _cache_claims(self, cache_key, decoded_token):
+        """cache verified claims until shortly before the token expires"""
+        exp = decoded_token.get('exp')
+        if not isinstance(exp, (int, float)):
+            return
+        
+        # stop trusting the cached entry a bit early to cover clock skew between us and cognito
+        expires_at = exp - self.clock_skew_seconds
+        if expires_at > time.time():
+            self.claims_cache.set(cache_key, dict(decoded_token), expires_at=expires_at)
+    
+    def get_unverified_claims(self, id_token):
+        """
+        read the token payload without verifying it
+        only for speculative work - never trust these claims on their own
+        """
+        try:
+            return get_unverified_claims(id_token)
+        except TokenVerificationError as e:
+            raise ValueError(f"bad token: {str(e)}")
+    
+    def get_plausible_sub(self, id_token):
+        """
+        the sub of a token that passes every check short of the signature: rs256 with a
+        kid we already have a key for, our audience and issuer, not expired.
+        gate for speculative work, so forged tokens can't make us query dynamodb
+        
+        returns:
+            str: unverified sub, or none when the token already looks wrong
+        """
+        try:
+            header = get_unverified_header(id_token)
+            if header.get('alg') != 'RS256' or not self.key_store.has_key(header.get('kid')):
+                return None
+            claims = get_unverified_claims(id_token)
+            validate_claims(claims, self.app_client_id, self.issuer)
+        except TokenVerificationError:
+            return None
+        sub = claims.get('sub')
+        return sub if isinstance(sub, str) and sub else None
+    
     def extract_user_info(self, id_token):
         """
         convenient function: verify token + extract user details
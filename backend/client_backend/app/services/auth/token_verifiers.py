@@ -0,0 +1,193 @@
+import json
+import time
+import base64
+import importlib.util
+
+# heavy crypto libraries are imported when a verifier first needs them, not at cold start.
+# cryptography is optional: without it we fall back to python-jose
+HAS_CRYPTOGRAPHY = importlib.util.find_spec('cryptography') is not None
+
+
+class TokenVerificationError(Exception):
+    """raised when a token is malformed, badly signed or has invalid claims"""
+
+
+def _b64url_decode(segment):
+    """decode a base64url segment (jwt strips the padding)"""
+    if isinstance(segment, str):
+        segment = segment.encode('ascii')
+    return base64.urlsafe_b64decode(segment + b'=' * (-len(segment) % 4))
+
+
+def _b64url_to_int(value):
+    """decode a base64url jwk member (n, e) into an integer"""
+    return int.from_bytes(_b64url_decode(value), 'big')
+
+
+def _split_token(token):
+    """split a compact jws into its decoded parts without checking anything"""
+    try:
+        header_segment, payload_segment, signature_segment = token.split('.')
+        header = json.loads(_b64url_decode(header_segment))
+        claims = json.loads(_b64url_decode(payload_segment))
+        signature = _b64url_decode(signature_segment)
+    except Exception:
+        raise TokenVerificationError("Error decoding token headers.")
+
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise TokenVerificationError("Invalid token segments.")
+
+    signing_input = f"{header_segment}.{payload_segment}".encode('ascii')
+    return header, claims, signing_input, signature
+
+
+def get_unverified_header(token):
+    """peek at the jwt header (kid, alg) - nothing is verified here"""
+    return _split_token(token)[0]
+
+
+def get_unverified_claims(token):
+    """peek at the jwt payload - never trust these without verify()"""
+    return _split_token(token)[1]
+
+
+def validate_claims(claims, audience, issuer, leeway=0):
+    """
+    check the registered claims cognito sets on id tokens
+
+    args:
+        claims (dict): decoded jwt payload
+        audience (str): expected app client id
+        issuer (str): expected user pool issuer url
+        leeway (int): seconds of clock skew tolerated on exp/nbf
+
+    raises:
+        TokenVerificationError: if any claim doesn't match
+    """
+    now = time.time()
+
+    exp = claims.get('exp')
+    if not isinstance(exp, (int, float)):
+        raise TokenVerificationError("Expiration Time claim (exp) must be an integer.")
+    if exp < now - leeway:
+        raise TokenVerificationError("Signature has expired.")
+
+    nbf = claims.get('nbf')
+    if nbf is not None and nbf > now + leeway:
+        raise TokenVerificationError("The token is not yet valid (nbf)")
+
+    aud = claims.get('aud')
+    audiences = aud if isinstance(aud, list) else [aud]
+    if audience not in audiences:
+        raise TokenVerificationError("Invalid audience")
+
+    if claims.get('iss') != issuer:
+        raise TokenVerificationError("Invalid issuer")
+
+
+class CryptographyVerifier:
+    """
+    rs256 verification straight on cryptography's rsa key objects
+    skips python-jose's per-call key construction and claim plumbing
+    """
+
+    name = 'cryptography'
+
+    def __init__(self):
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+        from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicNumbers
+
+        self._invalid_signature = InvalidSignature
+        self._padding = padding.PKCS1v15()
+        self._hash = hashes.SHA256()
+        self._public_numbers = RSAPublicNumbers
+
+    def prepare_key(self, jwk_dict):
+        """build the rsa public key object once, when keys are loaded"""
+        return self._public_numbers(
+            _b64url_to_int(jwk_dict['e']),
+            _b64url_to_int(jwk_dict['n'])
+        ).public_key()
+
+    def verify(self, token, key, audience, issuer):
+        """
+        verify signature + claims and return the claims
+
+        raises:
+            TokenVerificationError: if the token isn't valid
+        """
+        header, claims, signing_input, signature = _split_token(token)
+
+        if header.get('alg') != 'RS256':  # only allow rs256
+            raise TokenVerificationError("The specified alg value is not allowed")
+
+        try:
+            key.verify(signature, signing_input, self._padding, self._hash)
+        except self._invalid_signature:
+            raise TokenVerificationError("Signature verification failed.")
+
+        validate_claims(claims, audience, issuer)
+        return claims
+
+
+class JoseVerifier:
+    """
+    rs256 verification through python-jose (the original path)
+    keys are still pre-built into jose key objects so they aren't rebuilt per request
+    """
+
+    name = 'jose'
+
+    def __init__(self):
+        from jose import jwk, jwt, JWTError
+
+        self._jwk = jwk
+        self._jwt = jwt
+        self._jwt_error = JWTError
+
+    def prepare_key(self, jwk_dict):
+        """build the jose rsa key object once, when keys are loaded"""
+        return self._jwk.construct(jwk_dict, 'RS256')
+
+    def verify(self, token, key, audience, issuer):
+        """
+        verify signature + claims and return the claims
+
+        raises:
+            TokenVerificationError: if the token isn't valid
+        """
+        try:
+            return self._jwt.decode(
+                token,
+                key,
+                algorithms=['RS256'],  # only allow rs256
+                audience=audience,  # make sure token is for our app
+                issuer=issuer  # from our cognito
+            )
+        except self._jwt_error as e:
+            raise TokenVerificationError(str(e))
+
+
+def create_verifier(backend='auto'):
+    """
+    pick a verification backend
+
+    args:
+        backend (str): 'cryptography', 'jose' or 'auto' (cryptography when installed)
+
+    returns:
+        verifier with prepare_key() and verify()
+    """
+    if backend == 'auto':
+        backend = 'cryptography' if HAS_CRYPTOGRAPHY else 'jose'
+
+    if backend == 'cryptography':
+        if not HAS_CRYPTOGRAPHY:
+            raise ValueError("cryptography backend requested but cryptography is not installed")
+        return CryptographyVerifier()
+    if backend == 'jose':
+        return JoseVerifier()
+
+    raise ValueError(f"unknown jwt verify backend: {backend}")
@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+# compact converters between dynamodb's wire format ({"S": "..."}, {"N": "12.5"}, ...)
+# and the plain python types the api returns. the types are the ones boto3's
+# TypeDeserializer hands back (numbers as Decimal), so responses, etags and
+# JSON_DECIMAL_MODE behave the same on both api modes - only the decoding is cheaper
+
+
+def _number(text):
+    """dynamodb numbers arrive as strings: exact Decimal, like the resource path"""
+    return Decimal(text)
+
+
+def deserialize_value(attribute_value):
+    """decode one attribute value (common types first)"""
+    for tag, value in attribute_value.items():
+        if tag == 'S':
+            return value
+        if tag == 'N':
+            return _number(value)
+        if tag == 'M':
+            return {key: deserialize_value(item) for key, item in value.items()}
+        if tag == 'L':
+            return [deserialize_value(item) for item in value]
+        if tag == 'BOOL':
+            return value
+        if tag == 'NULL':
+            return None
+        if tag == 'SS':
+            return set(value)
+        if tag == 'NS':
+            return {_number(item) for item in value}
+        if tag == 'B':
+            return value
+        if tag == 'BS':
+            return set(value)
+        raise ValueError(f"unsupported dynamodb type: {tag}")
+
+
+def deserialize_item(item):
+    """decode a whole item (or key) from wire format"""
+    result = {}
+    for key, attribute_value in item.items():
+        # strings and numbers are nearly every attribute in the order schema
+        if 'S' in attribute_value:
+            result[key] = attribute_value['S']
+        elif 'N' in attribute_value:
+            result[key] = _number(attribute_value['N'])
+        else:
+            result[key] = deserialize_value(attribute_value)
+    return result
+
+
+def serialize_value(value):
+    """encode one python value into an attribute value"""
+    if isinstance(value, str):
+        return {'S': value}
+    if isinstance(value, bool):  # before int: bool is an int subclass
+        return {'BOOL': value}
+    if isinstance(value, (int, Decimal)):
+        return {'N': str(value)}
+    if isinstance(value, float):
+        return {'N': repr(value)}
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, dict):
+        return {'M': {key: serialize_value(item) for key, item in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {'L': [serialize_value(item) for item in value]}
+    if isinstance(value, (bytes, bytearray)):
+        return {'B': bytes(value)}
+    if isinstance(value, (set, frozenset)):
+        return _serialize_set(value)
+    raise ValueError(f"can't store {type(value).__name__} in dynamodb")
+
+
+def _serialize_set(value):
+    """string, number or binary set - non-empty and of one kind, as dynamodb requires"""
+    if not value:
+        raise ValueError("can't store an empty set in dynamodb")
+    if all(isinstance(item, str) for item in value):
+        return {'SS': list(value)}
+    if all(isinstance(item, (int, float, Decimal)) and not isinstance(item, bool) for item in value):
+        return {'NS': [serialize_value(item)['N'] for item in value]}
+    if all(isinstance(item, (bytes, bytearray)) for item in value):
+        return {'BS': [bytes(item) for item in value]}
+    raise ValueError("a dynamodb set holds only strings, only numbers or only bytes")
+
+
+def serialize_item(item):
+    """encode a whole item (or key, or ExpressionAttributeValues) into wire format"""
+    return {key: serialize_value(value) for key, value in item.items()}
@@ -0,0 +1,332 @@
+import os
+import time
+import random
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from utils.logger import get_logger
+
+# policy around every dynamodb call DynamoDBService makes:
+# - failures surface as typed errors instead of looking like "no data"
+# - throttling is retried with full-jitter backoff (on top of botocore's own retries)
+# - a per-container circuit breaker per table fails fast while dynamodb is struggling
+# - optional hedged reads: a second identical read if the first is slower than the recent p95
+
+logger = get_logger('dynamodb_resilience')
+
+THROTTLING_CODES = {
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'TransactionInProgressException'
+}
+UNAVAILABLE_CODES = {'InternalServerError', 'ServiceUnavailable', 'InternalFailure'}
+
+
+class DynamoDBError(Exception):
+    """a dynamodb call failed; `code` is dynamodb's error code when there is one"""
+
+    def __init__(self, message, code=None, retry_after_seconds=1):
+        super().__init__(message)
+        self.code = code
+        self.retry_after_seconds = retry_after_seconds
+
+
+class DynamoDBThrottledError(DynamoDBError):
+    """still throttled after the retries"""
+
+
+class DynamoDBUnavailableError(DynamoDBError):
+    """timeouts, connection errors, 5xx - dynamodb couldn't be reached or answer"""
+
+
+class CircuitOpenError(DynamoDBUnavailableError):
+    """the breaker is open, the call wasn't attempted"""
+
+
+def policy_retries():
+    """
+    DDB_THROTTLE_RETRIES: retries the policy makes itself. when it retries, botocore
+    gets a single attempt (dynamodb_transport), so the two layers never multiply
+    """
+    return int(os.environ.get('DDB_THROTTLE_RETRIES', '2'))
+
+
+# failures a client should retry (503 + Retry-After); any other DynamoDBError
+# (validation, access denied, missing table...) won't go away by retrying
+RETRYABLE_ERRORS = (DynamoDBThrottledError, DynamoDBUnavailableError)
+
+
+def classify_error(error):
+    """
+    map an exception from boto3/botocore to one of the typed errors
+
+    args:
+        error (Exception): what the call raised
+
+    returns:
+        DynamoDBError: typed error (the original is kept as __cause__ by the caller)
+    """
+    if isinstance(error, DynamoDBError):
+        return error
+
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        code = response.get('Error', {}).get('Code')
+        message = f"{code}: {response.get('Error', {}).get('Message', '')}"
+        if code in THROTTLING_CODES or _cancelled_by_throttling(response):
+            return DynamoDBThrottledError(message, code)
+        if code in UNAVAILABLE_CODES:
+            return DynamoDBUnavailableError(message, code)
+        return DynamoDBError(message, code)
+
+    # botocore's ReadTimeoutError, ConnectTimeoutError, EndpointConnectionError, ConnectionClosedError...
+    module = type(error).__module__ or ''
+    if module.startswith(('botocore', 'urllib3')) or isinstance(error, (TimeoutError, ConnectionError)):
+        return DynamoDBUnavailableError(f"{type(error).__name__}: {error}")
+
+    return DynamoDBError(f"{type(error).__name__}: {error}")
+
+
+def _cancelled_by_throttling(response):
+    """a cancelled transaction where some item was throttled (rather than failing its condition)"""
+    reasons = response.get('CancellationReasons') or []
+    return any(reason.get('Code') in ('ThrottlingError', 'ProvisionedThroughputExceeded') for reason in reasons)
+
+
+def _worth_retrying(error):
+    """throttled or unavailable - a later attempt can succeed (an open circuit won't let it)"""
+    return isinstance(error, RETRYABLE_ERRORS) and not isinstance(error, CircuitOpenError)
+
+
+def _counts_against_breaker(error):
+    """only "dynamodb is struggling" failures open the breaker, not bad requests"""
+    return isinstance(error, RETRYABLE_ERRORS) and not isinstance(error, CircuitOpenError)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures, open -> half open
+    after `reset_timeout_seconds`, where one trial call decides between closed and open
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout_seconds=10):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def retry_after_seconds(self):
+        """seconds until an open breaker lets a trial call through"""
+        remaining = self.reset_timeout_seconds - (time.monotonic() - self._opened_at)
+        return max(1, int(remaining + 0.999))
+
+    def allow(self):
+        """may a call go ahead? (in half open state only one trial call at a time)"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open':
+                if time.monotonic() - self._opened_at < self.reset_timeout_seconds:
+                    return False
+                self.state = 'half_open'
+                self._trial_running = False
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                logger.info("circuit %s closed", self.name)
+            self.state = 'closed'
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self.state == 'half_open' or self._failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning("circuit %s opened after %s failures", self.name, self._failures)
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """recent latencies of one kind of call, for the hedging delay"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, latency_ms):
+        with self._lock:
+            self._samples.append(latency_ms)
+
+    def percentile(self, percent, min_samples=20):
+        """latency at the given percentile, none until there are enough samples"""
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_hedge_pool = None
+
+
+def get_breaker(name):
+    """the container's breaker for a table (shared by every DynamoDBService)"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name,
+                    failure_threshold=int(os.environ.get('DDB_BREAKER_FAILURE_THRESHOLD', '5')),
+                    reset_timeout_seconds=float(os.environ.get('DDB_BREAKER_RESET_SECONDS', '10'))
+                )
+                _breakers[name] = breaker
+    return breaker
+
+
+def reset_breakers():
+    """forget breaker state (fresh container)"""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def _get_hedge_pool():
+    global _hedge_pool
+    if _hedge_pool is None:
+        _hedge_pool = ThreadPoolExecutor(
+            max_workers=int(os.environ.get('DDB_HEDGE_POOL_SIZE', '8')),
+            thread_name_prefix='ddb-hedge'
+        )
+    return _hedge_pool
+
+
+class ResiliencePolicy:
+    """retries, breaker and hedging for one DynamoDBService"""
+
+    def __init__(self):
+        # throttled and unavailable (timeout, 5xx) calls are retried here, not by botocore,
+        # and never once the next attempt would start past the deadline
+        self.throttle_retries = policy_retries()
+        self.retry_deadline_seconds = float(os.environ.get('DDB_RETRY_DEADLINE_SECONDS', '4'))
+        self.backoff_base_seconds = float(os.environ.get('DDB_THROTTLE_BACKOFF_BASE_SECONDS', '0.05'))
+        self.backoff_max_seconds = float(os.environ.get('DDB_THROTTLE_BACKOFF_MAX_SECONDS', '1'))
+        self.hedged_reads = os.environ.get('DDB_HEDGED_READS', 'false').lower() == 'true'
+        self.hedge_percentile = float(os.environ.get('DDB_HEDGE_PERCENTILE', '95'))
+        self.hedge_min_delay_ms = float(os.environ.get('DDB_HEDGE_MIN_DELAY_MS', '10'))
+        self._latencies = {}
+
+    def call(self, breaker_name, operation, fn, hedge=False):
+        """
+        run one dynamodb call under the policy
+
+        args:
+            breaker_name (str): breaker to use (the table name)
+            operation (str): kind of call, e.g. 'query' (latency tracking for hedging)
+            fn (callable): the call, no arguments
+            hedge (bool): the call is a read that may be sent twice
+
+        returns:
+            whatever fn returns
+
+        raises:
+            DynamoDBError: typed error when the call fails for good or the breaker is open
+        """
+        breaker = get_breaker(breaker_name)
+        if not breaker.allow():
+            raise CircuitOpenError(
+                f"circuit for {breaker_name} is open",
+                retry_after_seconds=breaker.retry_after_seconds()
+            )
+
+        attempt = 0
+        started = time.monotonic()
+        while True:
+            try:
+                if hedge and self.hedged_reads:
+                    result = self._hedged(operation, fn)
+                else:
+                    result = self._timed(operation, fn)
+            except Exception as e:
+                error = classify_error(e)
+                if _worth_retrying(error) and attempt < self.throttle_retries:
+                    delay = self._backoff_seconds(attempt + 1)
+                    if time.monotonic() - started + delay < self.retry_deadline_seconds:
+                        attempt += 1
+                        logger.warning("%s on %s failed (%s), retry %s in %.0f ms",
+                                       operation, breaker_name, type(error).__name__, attempt, delay * 1000)
+                        time.sleep(delay)
+                        continue
+                if _counts_against_breaker(error):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()  # dynamodb answered, just not with what we wanted
+                if error is e:
+                    raise
+                raise error from e
+
+            breaker.record_success()
+            return result
+
+    def _backoff_seconds(self, attempt):
+        """full jitter: random delay up to base * 2^attempt, capped"""
+        ceiling = min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def _tracker(self, operation):
+        tracker = self._latencies.get(operation)
+        if tracker is None:
+            tracker = self._latencies.setdefault(operation, LatencyTracker())
+        return tracker
+
+    def _timed(self, operation, fn):
+        started = time.perf_counter()
+        result = fn()
+        self._tracker(operation).add((time.perf_counter() - started) * 1000)
+        return result
+
+    def hedge_delay_ms(self, operation):
+        """how long to wait before sending the second read, none while there's too little data"""
+        p = self._tracker(operation).percentile(self.hedge_percentile)
+        return None if p is None else max(p, self.hedge_min_delay_ms)
+
+    def _hedged(self, operation, fn):
+        """send fn, and fn again if it's slower than the recent p95; first answer wins"""
+        delay_ms = self.hedge_delay_ms(operation)
+        if delay_ms is None:
+            return self._timed(operation, fn)
+
+        pool = _get_hedge_pool()
+        primary = pool.submit(contextvars.copy_context().run, self._timed, operation, fn)
+        done, _ = wait([primary], timeout=delay_ms / 1000)
+        if done:
+            return primary.result()
+
+        logger.debug("hedging %s after %.1f ms", operation, delay_ms)
+        hedge = pool.submit(contextvars.copy_context().run, self._timed, operation, fn)
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()  # the slower one finishes in the background
+                first_error = first_error or future.exception()
+        raise first_error
@@ -0,0 +1,142 @@
+import os
+import threading
+from services.aws.dynamodb_resilience import policy_retries
+
+# one boto3 session per container and one client/resource per transport profile,
+# shared by every service that talks to dynamodb. profiles only differ in read
+# timeout (botocore timeouts are per client): reads should fail fast, writes get
+# a little longer. everything is tunable from the environment
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+_resources = {}
+
+PROFILES = ('read', 'write')
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def default_pool_connections():
+    """
+    one connection per thread that can be inside a dynamodb call at the same time: the
+    request thread plus the speculative, batch get and hedge pools sharing these clients
+    (fewer and urllib3 drops connections with "Connection pool is full")
+    """
+    return (
+        1
+        + _env_int('SPECULATIVE_POOL_SIZE', '4')
+        + _env_int('DDB_BATCH_GET_WORKERS', '4')
+        + _env_int('DDB_HEDGE_POOL_SIZE', '8')
+    )
+
+
+def transport_settings(profile='read'):
+    """
+    effective transport settings for a profile
+
+    args:
+        profile (str): 'read' or 'write'
+
+    returns:
+        dict: timeouts, pool size, keep-alive and retry settings
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"unknown dynamodb transport profile: {profile}")
+
+    return {
+        'connect_timeout': _env_float('DDB_CONNECT_TIMEOUT_SECONDS', '1'),
+        'read_timeout': _env_float(
+            f"DDB_{profile.upper()}_TIMEOUT_SECONDS", '2' if profile == 'read' else '3'
+        ),
+        'max_pool_connections': _env_int('DDB_MAX_POOL_CONNECTIONS', str(default_pool_connections())),
+        'tcp_keepalive': os.environ.get('DDB_TCP_KEEPALIVE', 'true').lower() == 'true',
+        'retry_mode': os.environ.get('DDB_RETRY_MODE', 'adaptive'),
+        # botocore only retries when the resilience layer doesn't, one layer of retries, not two
+        'max_attempts': 1 if policy_retries() > 0 else _env_int('DDB_MAX_ATTEMPTS', '3')
+    }
+
+
+def _build_config(profile):
+    """botocore Config for a profile"""
+    from botocore.config import Config
+
+    settings = transport_settings(profile)
+    return Config(
+        connect_timeout=settings['connect_timeout'],
+        read_timeout=settings['read_timeout'],
+        max_pool_connections=settings['max_pool_connections'],
+        tcp_keepalive=settings['tcp_keepalive'],
+        retries={
+            'mode': settings['retry_mode'],
+            'total_max_attempts': settings['max_attempts']
+        }
+    )
+
+
+def get_session():
+    """the container's boto3 session (sessions aren't thread-safe, so build clients under the lock)"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                import boto3
+                _session = boto3.session.Session()
+    return _session
+
+
+def get_dynamodb_client(profile='read'):
+    """
+    shared low-level dynamodb client
+
+    args:
+        profile (str): 'read' or 'write'
+
+    returns:
+        botocore client
+    """
+    client = _clients.get(profile)
+    if client is None:
+        session = get_session()
+        with _lock:
+            client = _clients.get(profile)
+            if client is None:
+                client = session.client('dynamodb', config=_build_config(profile))
+                _clients[profile] = client
+    return client
+
+
+def get_dynamodb_resource(profile='read'):
+    """
+    shared dynamodb resource
+
+    args:
+        profile (str): 'read' or 'write'
+
+    returns:
+        boto3 dynamodb resource
+    """
+    resource = _resources.get(profile)
+    if resource is None:
+        session = get_session()
+        with _lock:
+            resource = _resources.get(profile)
+            if resource is None:
+                resource = session.resource('dynamodb', config=_build_config(profile))
+                _resources[profile] = resource
+    return resource
+
+
+def reset():
+    """drop the shared session and clients (fresh container)"""
+    global _session
+    with _lock:
+        _session = None
+        _clients.clear()
+        _resources.clear()
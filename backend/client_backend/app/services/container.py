@@ -0,0 +1,100 @@
+import os
+import threading
+from utils.logger import get_logger
+
+# one set of services per lambda container, shared by every handler module.
+# nothing is built at import time: boto3 / jose / cryptography load on first use,
+# or during the init phase when PRIME_ON_INIT is on
+
+_lock = threading.RLock()  # factories build their dependencies while holding it
+_services = {}
+_primed = False
+logger = get_logger('container')
+
+
+def _get_or_create(name, factory):
+    """build a service once per container (thread-safe, handlers may use worker threads)"""
+    service = _services.get(name)
+    if service is None:
+        with _lock:
+            service = _services.get(name)
+            if service is None:
+                service = factory()
+                _services[name] = service
+    return service
+
+
+def get_dynamodb_service():
+    """shared DynamoDBService"""
+    def factory():
+        from services.aws.dynamodb_service import DynamoDBService
+        return DynamoDBService()
+    return _get_or_create('dynamodb_service', factory)
+
+
+def get_jwt_service():
+    """shared JWTService"""
+    def factory():
+        from services.auth.jwt_service import JWTService
+        return JWTService()
+    return _get_or_create('jwt_service', factory)
+
+
+def get_order_repository():
+    """shared OrderRepository (its identity cache is per container)"""
+    def factory():
+        from services.repositories.order_repository import OrderRepository
+        return OrderRepository(get_dynamodb_service())
+    return _get_or_create('order_repository', factory)
+
+
+def get_idempotency_repository():
+    """shared IdempotencyRepository"""
+    def factory():
+        from services.repositories.idempotency_repository import IdempotencyRepository
+        return IdempotencyRepository(get_dynamodb_service())
+    return _get_or_create('idempotency_repository', factory)
+
+
+def get_order_domain():
+    """shared OrderDomain"""
+    def factory():
+        from domains.order_domain import OrderDomain
+        return OrderDomain(get_order_repository(), get_jwt_service(),
+                           idempotency_repository=get_idempotency_repository())
+    return _get_or_create('order_domain', factory)
+
+
+def prime():
+    """
+    do the first-request work now: build services, download cognito's keys and
+    open the dynamodb connection. meant for the init phase, which runs before the
+    first invocation (and with full cpu on small lambdas)
+    """
+    global _primed
+    if _primed:
+        return
+    _primed = True
+
+    get_order_domain()
+
+    try:
+        get_jwt_service().key_store.get_jwks()
+    except Exception as e:
+        logger.warning("jwks priming failed, first request will retry: %s", e)
+
+    get_dynamodb_service().warm_up()
+
+
+def prime_if_enabled():
+    """prime() when PRIME_ON_INIT=true - call at handler module import"""
+    if os.environ.get('PRIME_ON_INIT', 'false').lower() == 'true':
+        prime()
+
+
+def reset():
+    """forget every service (fresh container), used by the cold start measurements"""
+    global _primed
+    with _lock:
+        _services.clear()
+        _primed = False
@@ -0,0 +1,361 @@
+import io
+import os
+import csv
+import json
+import threading
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+
+from services.repositories.order_repository import SELECTABLE_ORDER_FIELDS
+from utils.response_formatter import to_json
+from utils.logger import get_logger
+
+# orders table -> ndjson/csv, one shard per parallel scan segment. items stream page by
+# page (scan page -> encoded bytes -> local file or s3 multipart part), so memory is
+# bounded by the page size and the s3 part size, never by the table. every segment
+# checkpoints its LastEvaluatedKey together with what its shard holds at that point,
+# so an interrupted export resumes each segment where it stopped
+
+logger = get_logger('order_export')
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+CSV_COLUMNS = ('user_id',) + SELECTABLE_ORDER_FIELDS
+
+# every part of a multipart upload but the last must be at least 5 MiB
+S3_MIN_PART_BYTES = 5 * 1024 * 1024
+
+
+def encode_ndjson(items):
+    """one json object per line (numbers as JSON_DECIMAL_MODE says)"""
+    return b''.join(to_json(item).encode('utf-8') + b'\n' for item in items)
+
+
+def csv_encoder(columns):
+    """encoder writing the given columns, missing attributes as empty cells"""
+    def encode(items):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        for item in items:
+            writer.writerow(['' if item.get(column) is None else _csv_value(item[column]) for column in columns])
+        return buffer.getvalue().encode('utf-8')
+    return encode
+
+
+def _csv_value(value):
+    """Decimals exactly as stored, everything else as str()"""
+    return format(value, 'f') if isinstance(value, Decimal) else str(value)
+
+
+class ExportCheckpoint:
+    """
+    per-segment progress in a json file:
+    {'settings': {...}, 'segments': {'3': {'last_key', 'items', 'sink', 'done'}}}
+    written after every durable page, so it survives the export being killed
+    """
+
+    def __init__(self, path, settings):
+        """
+        args:
+            path (str): checkpoint file, none to keep progress in memory only
+            settings (dict): what is being exported; resuming with different settings is refused
+
+        raises:
+            ValueError: if the file belongs to a different export
+        """
+        self.path = path
+        self.settings = settings
+        self.segments = {}
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get('settings') != settings:
+                raise ValueError(f"checkpoint {path} was written for a different export, remove it to start over")
+            self.segments = {int(segment): state for segment, state in saved.get('segments', {}).items()}
+
+    def segment(self, segment):
+        """saved state of a segment (empty when it hasn't started)"""
+        with self._lock:
+            return dict(self.segments.get(segment, {}))
+
+    def update(self, segment, **state):
+        """record a segment's progress and persist the file (atomically)"""
+        with self._lock:
+            self.segments[segment] = state
+            if not self.path:
+                return
+            document = {
+                'settings': self.settings,
+                'segments': {str(number): saved for number, saved in sorted(self.segments.items())}
+            }
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(document, f, default=str)
+            os.replace(temp_path, self.path)
+
+
+class LocalShard:
+    """one segment's output file; everything written is durable once flushed"""
+
+    def __init__(self, path, state=None):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        if state:
+            # drop whatever was written after the last checkpoint, it's scanned again
+            self._file = open(path, 'r+b')
+            self._file.truncate(state['bytes'])
+            self._file.seek(state['bytes'])
+        else:
+            self._file = open(path, 'wb')
+
+    def write(self, data):
+        self._file.write(data)
+
+    def checkpoint(self):
+        """sink state covering everything written so far"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {'bytes': self._file.tell()}
+
+    def finish(self):
+        state = self.checkpoint()
+        self._file.close()
+        return state
+
+    def abort(self):
+        self._file.close()
+
+
+class S3Shard:
+    """
+    one segment's output object, written with a multipart upload. data is buffered
+    until a part is big enough; only then is it durable (and checkpointable)
+    """
+
+    def __init__(self, s3_client, bucket, key, part_size, state=None):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, S3_MIN_PART_BYTES)
+        self.upload_id = (state or {}).get('upload_id')
+        self.parts = list((state or {}).get('parts', []))
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+
+    def checkpoint(self):
+        """upload a part if the buffer is big enough; sink state, or none while data is only buffered"""
+        if len(self._buffer) < self.part_size:
+            return None
+        self._upload_part()
+        return {'upload_id': self.upload_id, 'parts': list(self.parts)}
+
+    def finish(self):
+        """upload the rest and complete the object"""
+        if not self.parts:
+            # small shard: one plain put, no upload to complete
+            self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer))
+            if self.upload_id:
+                self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            return {'parts': []}
+
+        if self._buffer:
+            self._upload_part()
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={'Parts': self.parts}
+        )
+        return {'upload_id': self.upload_id, 'parts': list(self.parts)}
+
+    def abort(self):
+        # the upload stays open so a resumed export can continue it
+        # (a lifecycle rule with AbortIncompleteMultipartUpload cleans up abandoned ones)
+        self._buffer = bytearray()
+
+    def _upload_part(self):
+        if self.upload_id is None:
+            self.upload_id = self.s3.create_multipart_upload(Bucket=self.bucket, Key=self.key)['UploadId']
+        part_number = len(self.parts) + 1
+        response = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=bytes(self._buffer)
+        )
+        self.parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+        self._buffer = bytearray()
+
+
+class LocalDestination:
+    """shards as files in a local directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def location(self, name):
+        return os.path.join(self.directory, name)
+
+    def open_shard(self, name, state=None):
+        return LocalShard(self.location(name), state)
+
+
+class S3Destination:
+    """shards as objects under s3://bucket/prefix"""
+
+    def __init__(self, bucket, prefix, part_size=8 * 1024 * 1024, s3_client=None):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.part_size = part_size
+        if s3_client is None:
+            from services.aws import dynamodb_transport
+            s3_client = dynamodb_transport.get_session().client('s3')
+        self.s3 = s3_client
+
+    def location(self, name):
+        key = f"{self.prefix}/{name}" if self.prefix else name
+        return f"s3://{self.bucket}/{key}"
+
+    def open_shard(self, name, state=None):
+        key = f"{self.prefix}/{name}" if self.prefix else name
+        return S3Shard(self.s3, self.bucket, key, self.part_size, state)
+
+
+def destination_for(target, part_size=8 * 1024 * 1024):
+    """LocalDestination for a directory, S3Destination for s3://bucket/prefix"""
+    if target.startswith('s3://'):
+        bucket, _, prefix = target[len('s3://'):].partition('/')
+        if not bucket:
+            raise ValueError(f"invalid s3 destination: {target}")
+        return S3Destination(bucket, prefix, part_size=part_size)
+    return LocalDestination(target)
+
+
+class OrderExporter:
+    """
+    exporter = OrderExporter(dynamodb_service, destination_for('s3://bucket/orders'), checkpoint_path='export.json')
+    stats = exporter.run()  # call again with the same settings to resume
+    """
+
+    def __init__(self, dynamodb_service, destination, export_format='ndjson', total_segments=8, workers=None,
+                 page_size=1000, fields=None, checkpoint_path=None):
+        """
+        args:
+            dynamodb_service: instance of DynamoDBService
+            destination: LocalDestination or S3Destination (see destination_for)
+            export_format (str): 'ndjson' or 'csv'
+            total_segments (int): parallel scan segments (= output shards)
+            workers (int, optional): segments scanned at once, defaults to total_segments
+            page_size (int): items evaluated per Scan call
+            fields (list, optional): order attributes to export, from SELECTABLE_ORDER_FIELDS (+ user_id)
+            checkpoint_path (str, optional): progress file for resuming
+
+        raises:
+            ValueError: for unknown formats/fields, or a checkpoint of another export
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+        if total_segments < 1:
+            raise ValueError("total_segments must be at least 1")
+        unknown = [field for field in fields or [] if field not in CSV_COLUMNS]
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)}")
+
+        self.dynamodb_service = dynamodb_service
+        self.destination = destination
+        self.export_format = export_format
+        self.total_segments = total_segments
+        self.workers = workers or total_segments
+        self.page_size = page_size
+        self.fields = list(fields) if fields else None
+        self.columns = tuple(self.fields) if self.fields else CSV_COLUMNS
+        self._encode = encode_ndjson if export_format == 'ndjson' else csv_encoder(self.columns)
+
+        self.checkpoint = ExportCheckpoint(checkpoint_path, {
+            'table': dynamodb_service.orders_table_name,
+            'destination': destination.location(''),
+            'format': export_format,
+            'total_segments': total_segments,
+            'fields': self.fields
+        })
+
+    def shard_name(self, segment):
+        return f"part-{segment:05d}-of-{self.total_segments:05d}.{self.export_format}"
+
+    def run(self):
+        """
+        export every segment (finished ones from an earlier run are skipped)
+
+        returns:
+            dict: items exported, shard locations, segments resumed
+
+        raises:
+            DynamoDBError / s3 errors: from the first failed segment, once the others are done
+                (their progress is checkpointed, run again to resume)
+        """
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='order-export') as pool:
+            futures = [pool.submit(self._export_segment, segment) for segment in range(self.total_segments)]
+
+        failures = [future.exception() for future in futures if future.exception() is not None]
+        if failures:
+            raise failures[0]
+
+        results = [future.result() for future in futures]
+        return {
+            'items': sum(result['items'] for result in results),
+            'segments': self.total_segments,
+            'resumed_segments': sum(1 for result in results if result['resumed']),
+            'shards': [result['location'] for result in results]
+        }
+
+    def _export_segment(self, segment):
+        """scan one segment into its shard, checkpointing after every durable page"""
+        name = self.shard_name(segment)
+        state = self.checkpoint.segment(segment)
+        result = {'items': state.get('items', 0), 'resumed': bool(state), 'location': self.destination.location(name)}
+        if state.get('done'):
+            return result
+
+        shard = self.destination.open_shard(name, state.get('sink'))
+        if not state.get('sink') and self.export_format == 'csv':
+            shard.write(','.join(self.columns).encode('utf-8') + b'\n')
+
+        exported = state.get('items', 0)
+        pending = 0  # items written but not covered by a checkpoint yet
+        try:
+            pages = self.dynamodb_service.scan_orders_segment(
+                segment,
+                self.total_segments,
+                exclusive_start_key=state.get('last_key'),
+                page_size=self.page_size,
+                fields=self.fields
+            )
+            for items, last_key in pages:
+                shard.write(self._encode([self._public(item) for item in items]))
+                pending += len(items)
+                if not last_key:
+                    break
+                sink_state = shard.checkpoint()
+                if sink_state is not None:
+                    exported, pending = exported + pending, 0
+                    self.checkpoint.update(segment, last_key=last_key, items=exported, sink=sink_state)
+
+            sink_state = shard.finish()
+        except Exception:
+            shard.abort()
+            logger.error("export of segment %s stopped after %s items", segment, exported)
+            raise
+
+        exported += pending
+        self.checkpoint.update(segment, done=True, items=exported, sink=sink_state)
+        logger.info("segment %s exported", segment, items=exported, location=result['location'])
+        result['items'] = exported
+        return result
+
+    def _public(self, item):
+        """order item without the table keys (user_id / order_id carry the same values)"""
+        return {key: value for key, value in item.items() if key not in ('PK', 'SK')}
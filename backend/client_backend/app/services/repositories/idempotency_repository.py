@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import hashlib
+from utils.response_formatter import to_json
+from utils.logger import get_logger
+from services.aws.dynamodb_service import idempotency_record_key
+
+# Idempotency-Key handling for order creation. a key is claimed with a conditional put
+# (in_progress, short lock), the order is written, then the record is completed with the
+# created order and a long ttl. a retry with the same key gets that order back with one
+# GetItem; a retry while the first request is still running gets a conflict
+
+logger = get_logger('idempotency_repository')
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflictError(ValueError):
+    """a request with this key is still being processed"""
+
+
+class IdempotencyKeyReusedError(ValueError):
+    """the key was already used with a different request body"""
+
+
+def validate_idempotency_key(key):
+    """
+    check an Idempotency-Key header value
+
+    args:
+        key (str): header value
+
+    returns:
+        str: the key
+
+    raises:
+        ValueError: if empty, too long or not printable ascii
+    """
+    if not key or len(key) > MAX_KEY_LENGTH or not key.isascii() or not key.isprintable():
+        raise ValueError(f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} printable ascii characters")
+    return key
+
+
+def request_fingerprint(payload):
+    """hash of a parsed request body (key order and whitespace don't matter, values do)"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class IdempotencyRepository:
+    """
+    records of Idempotency-Keys, per cognito sub (so replays don't need the user lookup)
+    """
+
+    def __init__(self, dynamodb_service):
+        """
+        args:
+            dynamodb_service: instance of DynamoDBService
+        """
+        self.dynamodb_service = dynamodb_service
+        # completed records answer retries this long
+        self.ttl_seconds = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))
+        # an in-progress claim older than this is treated as abandoned (longer than the lambda timeout)
+        self.lock_seconds = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '30'))
+
+    def get(self, owner, key):
+        """
+        live record of a key
+
+        args:
+            owner (str): cognito sub
+            key (str): Idempotency-Key
+
+        returns:
+            dict: {'status', 'fingerprint', 'order' (order item), 'expired'} or none if never used
+        """
+        record = self.dynamodb_service.get_idempotency_record(owner, key)
+        if not record:
+            return None
+        return {
+            'status': record.get('status'),
+            'fingerprint': record.get('fingerprint'),
+            # stored as rendered (JSON_DECIMAL_MODE), so the replayed response matches the original
+            'order': json.loads(record['order']) if record.get('order') else None,
+            # ttl deletion lags, so expiry is checked here too
+            'expired': int(record.get('expires_at', 0)) < int(time.time())
+        }
+
+    def claim(self, owner, key, fingerprint, order_item):
+        """
+        take the key for a request about to write order_item
+
+        returns:
+            bool: true if claimed, false if a live record already holds it
+        """
+        now = int(time.time())
+        return self.dynamodb_service.claim_idempotency_record(
+            self._record(owner, key, 'in_progress', fingerprint, order_item, now + self.lock_seconds),
+            now
+        )
+
+    def complete(self, owner, key, fingerprint, order_item):
+        """store the created order as the key's response (kept for ttl_seconds)"""
+        completed = self.dynamodb_service.complete_idempotency_record(
+            self._record(owner, key, 'completed', fingerprint, order_item, int(time.time()) + self.ttl_seconds)
+        )
+        if not completed:
+            # our claim expired and was taken over; the order is written, only replay is lost
+            logger.warning("idempotency claim for order %s was lost before it completed", order_item['order_id'])
+
+    def release(self, owner, key, order_item):
+        """give the key back after a failed write"""
+        self.dynamodb_service.release_idempotency_record(owner, key, order_item['order_id'])
+
+    def _record(self, owner, key, status, fingerprint, order_item, expires_at):
+        record = idempotency_record_key(owner, key)
+        record.update({
+            'status': status,
+            'fingerprint': fingerprint,
+            'order_id': order_item['order_id'],
+            'order': to_json(order_item),
+            'expires_at': expires_at
+        })
+        return record
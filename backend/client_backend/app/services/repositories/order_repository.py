@@ -1,5 +1,22 @@
-import uuid
-from datetime import datetime
+import os
+import time
+import itertools
+from datetime import datetime, timedelta, timezone
+from utils.ttl_cache import TTLCache
+from utils.cursor_codec import decode_cursor, encode_cursor
+from utils.order_ids import generate_order_id, order_id_lower_bound, order_id_upper_bound, LEGACY_ORDER_ID_PREFIX
+from utils.response_formatter import compute_etag
+from services.aws.dynamodb_service import TOTAL_SPEND_PREFIX
+from utils import metrics
+
+# cached marker for "no user with this sub", so misses can be cached too
+_USER_NOT_FOUND = object()
+
+# order attributes clients may ask for with ?fields= (keys and internal attributes stay out)
+SELECTABLE_ORDER_FIELDS = (
+    'order_id', 'item_name', 'quantity', 'price_per_item', 'total_price',
+    'currency', 'status', 'created_at'
+)
 
 class OrderRepository:
     """
@@ -7,70 +24,384 @@ class OrderRepository:
     handles querying and creating orders
     """
     
-    def __init__(self, dynamodb_service):
-        """initialize with dynamodb service"""
+    def __init__(self, dynamodb_service, identity_cache=None, page_cache=None):
+        """
+        initialize with dynamodb service
+        
+        args:
+            dynamodb_service: instance of DynamoDBService
+            identity_cache (TTLCache, optional): cognito sub -> user item cache, built from env if omitted
+            page_cache (TTLCache, optional): user id -> order pages cache, built from env if omitted
+        """
         self.dynamodb_service = dynamodb_service
+        
+        # sub -> user basically never changes, so keep it for the life of the container (bounded)
+        self.identity_cache_ttl = float(os.environ.get('IDENTITY_CACHE_TTL_SECONDS', '300'))
+        self.identity_negative_ttl = float(os.environ.get('IDENTITY_CACHE_NEGATIVE_TTL_SECONDS', '10'))
+        self.identity_cache = identity_cache if identity_cache is not None else TTLCache(
+            max_size=int(os.environ.get('IDENTITY_CACHE_SIZE', '1024'))
+        )
+        
+        # page sizes for order listings
+        self.default_page_size = int(os.environ.get('ORDERS_DEFAULT_PAGE_SIZE', '50'))
+        self.max_page_size = int(os.environ.get('ORDERS_MAX_PAGE_SIZE', '100'))
+        
+        # recently read pages per user, dropped when this container writes an order for the user.
+        # other containers' writes show up once the ttl runs out (0 disables the cache)
+        self.page_cache_ttl = float(os.environ.get('ORDERS_CACHE_TTL_SECONDS', '10'))
+        page_cache_size = int(os.environ.get('ORDERS_CACHE_SIZE', '256'))
+        self.page_cache = page_cache if page_cache is not None else TTLCache(max_size=page_cache_size)
+        # user id -> version stamped by the last invalidation, so a read that raced a write isn't cached
+        self._page_versions = TTLCache(max_size=page_cache_size)
+        self._version_counter = itertools.count(1)
+        self._page_cache_epoch = 0  # bumped when the whole cache is dropped
+        
+        # keep the per-user summary item (count, spend per currency, last order) up to date on writes
+        self.summaries_enabled = os.environ.get('ORDER_SUMMARIES_ENABLED', 'true').lower() == 'true'
     
-    def get_orders_by_user_id(self, user_id):
+    def get_orders_page(self, user_id, limit=None, cursor=None, newest_first=True,
+                        created_from=None, created_to=None, fields=None):
         """
-        get all orders for a specific user
+        get one page of a user's orders
         
         args:
             user_id (str): the user id (like user-9fef7f58)
+            limit (int, optional): page size, capped at the configured max
+            cursor (str, optional): next_cursor from the previous page
+            newest_first (bool): newest orders first
+            created_from (datetime, optional): only orders created at/after this
+            created_to (datetime, optional): only orders created at/before this
+            fields (list, optional): order attributes to return, from SELECTABLE_ORDER_FIELDS
             
         returns:
-            list: list of order items for the user
+            dict: {'orders': [...], 'next_cursor': str or none, 'etag': str}, shared with
+            the page cache so don't modify it
+            
+        raises:
+            InvalidCursorError: if the cursor is invalid or not this user's
         """
-        return self.dynamodb_service.query_orders_by_user(user_id)
+        page_size = min(limit or self.default_page_size, self.max_page_size)
+        fields = tuple(fields) if fields else None
+        page_key = (page_size, cursor or '', newest_first, _isoformat(created_from), _isoformat(created_to), fields)
+        
+        cached_pages = self.page_cache.get(user_id) if self.page_cache_ttl > 0 else None
+        if cached_pages and page_key in cached_pages:
+            return cached_pages[page_key]
+        
+        version = self._page_version(user_id)
+        start_key = decode_cursor(cursor, user_id)
+        
+        if created_from is None and created_to is None:
+            orders, last_key = self.dynamodb_service.query_orders_page(
+                user_id,
+                limit=page_size,
+                exclusive_start_key=start_key,
+                newest_first=newest_first,
+                fields=fields
+            )
+        else:
+            orders, last_key = self._query_date_range(
+                user_id, page_size, start_key, newest_first, created_from, created_to, fields
+            )
+        
+        next_cursor = encode_cursor(last_key, user_id)
+        page = {
+            'orders': orders,
+            'next_cursor': next_cursor,
+            'etag': compute_etag({'orders': orders, 'next_cursor': next_cursor})
+        }
+        self._cache_page(user_id, page_key, page, version)
+        return page
     
-    def create_order(self, user_id, order_data):
+    def get_orders_by_ids(self, user_id, order_ids, fields=None):
+        """
+        get specific orders of a user
+        
+        args:
+            user_id (str): the user id
+            order_ids (list): order ids to fetch
+            fields (list, optional): order attributes to return, from SELECTABLE_ORDER_FIELDS
+            
+        returns:
+            dict: {'orders': [...] in the requested order, 'not_found': [order ids], 'etag': str}
+        """
+        found = self.dynamodb_service.batch_get_orders(user_id, order_ids, fields=fields)
+        by_id = {order['SK']: order for order in found}
+        
+        orders, not_found = [], []
+        for order_id in dict.fromkeys(order_ids):
+            if order_id in by_id:
+                orders.append(by_id[order_id])
+            else:
+                not_found.append(order_id)
+        
+        if fields and 'SK' not in fields:
+            orders = [{key: value for key, value in order.items() if key != 'SK'} for order in orders]
+        
+        return {
+            'orders': orders,
+            'not_found': not_found,
+            'etag': compute_etag({'orders': orders, 'not_found': not_found})
+        }
+    
+    def _cache_page(self, user_id, page_key, page, version):
+        """remember a page unless the user's orders were invalidated while it was being read"""
+        if self.page_cache_ttl <= 0 or self._page_version(user_id) != version:
+            return
+        
+        # copy on write, readers on other threads may hold the old dict
+        pages = dict(self.page_cache.get(user_id) or {})
+        pages[page_key] = page
+        self.page_cache.set(user_id, pages, ttl_seconds=self.page_cache_ttl)
+    
+    def _page_version(self, user_id):
+        return self._page_cache_epoch, self._page_versions.get(user_id)
+    
+    def invalidate_orders(self, user_id=None):
+        """
+        drop cached order pages (called after this container writes an order)
+        
+        args:
+            user_id (str, optional): user whose pages to forget, or none to clear everything
+        """
+        if user_id is None:
+            self._page_cache_epoch += 1
+            self.page_cache.invalidate()
+            return
+        
+        self._page_versions.set(user_id, next(self._version_counter), ttl_seconds=self.page_cache_ttl)
+        self.page_cache.invalidate(user_id)
+    
+    def _query_date_range(self, user_id, page_size, start_key, newest_first, created_from, created_to, fields):
+        """
+        one page of a created-at window, in two sort key ranges: time-ordered ids as a plain
+        range, legacy ids (no timestamp in the id) with a created_at filter. legacy ids sort
+        before every time-ordered one, so newest first walks the time-ordered range first
+        
+        returns:
+            tuple: (orders, LastEvaluatedKey or none when done)
+        """
+        earliest = created_from or datetime(1970, 1, 1)
+        latest = created_to or datetime.now() + timedelta(days=1)
+        ranges = [
+            ((order_id_lower_bound(earliest), order_id_upper_bound(latest)), None),
+            # '~' sorts after every hex digit and '-', so this covers every legacy id
+            ((LEGACY_ORDER_ID_PREFIX, LEGACY_ORDER_ID_PREFIX + '~'), (_created_at(earliest), _created_at(latest)))
+        ]
+        if not newest_first:
+            ranges.reverse()
+        if start_key and start_key['SK'].startswith(LEGACY_ORDER_ID_PREFIX) != ranges[0][0][0].startswith(LEGACY_ORDER_ID_PREFIX):
+            ranges = ranges[1:]  # the cursor is already in the second range
+        
+        orders = []
+        for i, (sk_range, created_at_range) in enumerate(ranges):
+            items, last_key = self.dynamodb_service.query_orders_page(
+                user_id,
+                limit=page_size - len(orders),
+                exclusive_start_key=start_key,
+                newest_first=newest_first,
+                sk_range=sk_range,
+                fields=fields,
+                created_at_range=created_at_range
+            )
+            orders.extend(items)
+            if last_key:
+                return orders, last_key
+            start_key = None
+            if len(orders) >= page_size and i < len(ranges) - 1:
+                # full page right at the end of the first range: resume past its last possible key
+                return orders, {'PK': user_id, 'SK': sk_range[0] if newest_first else sk_range[1]}
+        return orders, None
+    
+    def create_order(self, user_id, order_fields):
         """
         create a new order for a user
         
         args:
             user_id (str): the user id
-            order_data (dict): order information (item_name, quantity, price_per_item)
+            order_fields (dict): validated order fields (OrderDomain._validate_order_data)
             
         returns:
             dict: created order item if successful, none otherwise
         """
-        # generate unique order id
-        order_id = f"order-{str(uuid.uuid4())[:8]}"
+        order_item = self.new_order_item(user_id, order_fields)
+        return order_item if self.save_order(order_item) else None
+    
+    def new_order_item(self, user_id, order_fields):
+        """
+        order item for validated order fields, with a fresh order id (nothing is written)
         
-        # calculate total price
-        total_price = order_data['quantity'] * order_data['price_per_item']
+        args:
+            user_id (str): the user id
+            order_fields (dict): validated order fields
+            
+        returns:
+            dict: order item, ready for save_order
+        """
+        return self._build_order_item(user_id, order_fields, int(time.time() * 1000))
+    
+    def save_order(self, order_item):
+        """
+        write an order item (conditionally: an existing order is never overwritten)
+        
+        args:
+            order_item (dict): from new_order_item
+            
+        returns:
+            bool: true if written, false if dynamodb refused the write
+        """
+        # save to dynamodb (with the summary update in the same transaction)
+        if self.summaries_enabled:
+            success = self.dynamodb_service.put_order_with_summary(order_item)
+        else:
+            success = self.dynamodb_service.put_order(order_item)
+        
+        if success:
+            self.invalidate_orders(order_item['PK'])
+        return success
+    
+    def get_order(self, user_id, order_id):
+        """
+        read one of the user's orders
+        
+        args:
+            user_id (str): the user id
+            order_id (str): the order id
+            
+        returns:
+            dict: order item, or none if it doesn't exist
+        """
+        return self.dynamodb_service.get_order(user_id, order_id)
+    
+    def create_orders(self, user_id, orders_fields):
+        """
+        create many orders for a user in batch writes
+        
+        args:
+            user_id (str): the user id
+            orders_fields (list): validated order fields, one dict per order
+            
+        returns:
+            list: (order item, written) tuples in input order
+        """
+        created_at_ms = int(time.time() * 1000)
+        order_items = [self._build_order_item(user_id, order_fields, created_at_ms) for order_fields in orders_fields]
+        
+        failed = self.dynamodb_service.batch_put_orders(order_items)
+        written = [order_item for order_item in order_items if order_item['SK'] not in failed]
+        if written:
+            self.invalidate_orders(user_id)
+            if self.summaries_enabled:
+                self._add_to_summary(user_id, written)
+        
+        return [(order_item, order_item['SK'] not in failed) for order_item in order_items]
+    
+    def _add_to_summary(self, user_id, order_items):
+        """one aggregated ADD for orders written by a batch (batch writes can't carry updates)"""
+        spend_by_currency = {}
+        for order_item in order_items:
+            currency = order_item['currency']
+            spend_by_currency[currency] = spend_by_currency.get(currency, 0) + order_item['total_price']
+        
+        newest = max(order_items, key=lambda order_item: order_item['SK'])
+        self.dynamodb_service.add_to_order_summary(
+            user_id,
+            order_count=len(order_items),
+            spend_by_currency=spend_by_currency,
+            last_order_at=newest['created_at'],
+            last_order_id=newest['order_id']
+        )
+    
+    def get_order_summary(self, user_id):
+        """
+        get the user's order aggregates
+        
+        args:
+            user_id (str): the user id
+            
+        returns:
+            dict: order_count, total_spend (currency -> amount), last_order_at, last_order_id
+        """
+        item = self.dynamodb_service.get_order_summary(user_id) or {}
+        return {
+            'order_count': int(item.get('order_count', 0)),
+            'total_spend': {
+                name[len(TOTAL_SPEND_PREFIX):]: value
+                for name, value in item.items() if name.startswith(TOTAL_SPEND_PREFIX)
+            },
+            'last_order_at': item.get('last_order_at'),
+            'last_order_id': item.get('last_order_id')
+        }
+    
+    def _build_order_item(self, user_id, order_fields, created_at_ms):
+        """order item for validated order fields (prices already Decimal, total computed)"""
+        # generate unique, time-ordered order id (doubles as the sort key)
+        order_id = generate_order_id(created_at_ms)
         
         # create order item following jambyref schema + minimal business fields
-        order_item = {
+        return {
             "PK": user_id,
             "SK": order_id,
             "user_id": user_id,
             "order_id": order_id,
-            "item_name": order_data['item_name'],
-            "quantity": order_data['quantity'],
-            "price_per_item": order_data['price_per_item'],
-            "total_price": total_price,
+            "item_name": order_fields['item_name'],
+            "quantity": order_fields['quantity'],
+            "price_per_item": order_fields['price_per_item'],
+            "total_price": order_fields['total_price'],
             "currency": "PHP",
             "status": "pending",
-            "created_at": datetime.now().isoformat()
+            "created_at": datetime.fromtimestamp(created_at_ms / 1000).isoformat()
         }
-        
-        # save to dynamodb
-        success = self.dynamodb_service.put_order(order_item)
-        
-        if success:
-            return order_item
-        else:
-            return None
     
-    def find_user_by_cognito_sub(self, cognito_sub):
+    def find_user_by_cognito_sub(self, cognito_sub, allow_scan=True):
         """
         find user record by cognito sub
         
         args:
             cognito_sub (str): cognito user sub
+            allow_scan (bool): false to never fall back to a table scan (unverified subs);
+                a miss is then not cached, a full lookup may still find the user
             
         returns:
             dict: user item if found, none otherwise
         """
-        return self.dynamodb_service.scan_users_by_sub(cognito_sub) 
\ No newline at end of file
+        with metrics.stage('user_lookup'):
+            return self._find_user_by_cognito_sub(cognito_sub, allow_scan)
+    
+    def _find_user_by_cognito_sub(self, cognito_sub, allow_scan=True):
+        """find_user_by_cognito_sub without the stage timer"""
+        cached = self.identity_cache.get(cognito_sub)
+        if cached is _USER_NOT_FOUND:
+            return None
+        if cached is not None:
+            return cached
+        
+        user = self.dynamodb_service.find_user_by_sub(cognito_sub, allow_scan=allow_scan)
+        if user is not None:
+            self.identity_cache.set(cognito_sub, user, ttl_seconds=self.identity_cache_ttl)
+        elif allow_scan:
+            # short ttl: a user confirmed a moment ago should show up quickly
+            self.identity_cache.set(cognito_sub, _USER_NOT_FOUND, ttl_seconds=self.identity_negative_ttl)
+        
+        return user
+    
+    def invalidate_user_identity(self, cognito_sub=None):
+        """
+        drop cached sub -> user entries (call when a user is deleted or re-linked)
+        
+        args:
+            cognito_sub (str, optional): sub to forget, or none to clear the whole cache
+        """
+        self.identity_cache.invalidate(cognito_sub) 
+
+
+def _created_at(moment):
+    """datetime -> created_at string for comparisons (stored naive, in utc)"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.isoformat()
+
+
+def _isoformat(value):
+    """datetime -> str for cache keys (none stays none)"""
+    return value.isoformat() if value is not None else None
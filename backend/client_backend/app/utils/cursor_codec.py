@@ -0,0 +1,91 @@
+import os
+import hmac
+import json
+import base64
+import hashlib
+import secrets
+from utils.logger import get_logger
+
+logger = get_logger('cursor_codec')
+
+class InvalidCursorError(ValueError):
+    """raised when a pagination cursor is malformed, tampered with or used by another user"""
+
+
+_cursor_secret = None
+
+def _get_secret():
+    """hmac key for cursors - set CURSOR_SECRET so cursors work across containers"""
+    global _cursor_secret
+    if _cursor_secret is None:
+        configured = os.environ.get('CURSOR_SECRET')
+        if configured:
+            _cursor_secret = configured.encode('utf-8')
+        else:
+            logger.warning("CURSOR_SECRET not set, cursors will only be valid on this container")
+            _cursor_secret = secrets.token_bytes(32)
+    return _cursor_secret
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(payload, scope):
+    """signature over the payload and who it was issued to"""
+    return hmac.new(_get_secret(), scope.encode('utf-8') + b'|' + payload, hashlib.sha256).digest()[:16]
+
+
+def encode_cursor(last_evaluated_key, scope):
+    """
+    turn a dynamodb LastEvaluatedKey into an opaque, signed cursor
+
+    args:
+        last_evaluated_key (dict): key to resume from, none when there are no more pages
+        scope (str): who the cursor belongs to (user id), checked on decode
+
+    returns:
+        str: cursor for the client, or none
+    """
+    if not last_evaluated_key:
+        return None
+
+    payload = json.dumps(last_evaluated_key, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return f"{_b64encode(payload)}.{_b64encode(_sign(payload, scope))}"
+
+
+def decode_cursor(cursor, scope):
+    """
+    verify a cursor and return the key to resume from
+
+    args:
+        cursor (str): value the client sent back, none/empty for the first page
+        scope (str): user id the request is for
+
+    returns:
+        dict: ExclusiveStartKey, or none for the first page
+
+    raises:
+        InvalidCursorError: if the cursor was tampered with or belongs to another scope
+    """
+    if not cursor:
+        return None
+
+    try:
+        payload_part, signature_part = cursor.split('.')
+        payload = _b64decode(payload_part)
+        signature = _b64decode(signature_part)
+    except Exception:
+        raise InvalidCursorError("invalid cursor")
+
+    if not hmac.compare_digest(signature, _sign(payload, scope)):
+        raise InvalidCursorError("invalid cursor")
+
+    try:
+        return json.loads(payload)
+    except ValueError:
+        raise InvalidCursorError("invalid cursor")
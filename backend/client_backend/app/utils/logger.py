@@ -0,0 +1,91 @@
+import os
+import re
+import json
+import random
+import contextvars
+
+# leveled json logger for lambda (one line per record on stdout -> cloudwatch).
+# messages are only formatted when the record is actually emitted, and callables
+# passed as args are only called then, so disabled debug logging costs ~nothing.
+# a sampled fraction of requests logs at debug regardless of LOG_LEVEL
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+_min_level = LEVELS.get(os.environ.get('LOG_LEVEL', 'INFO').upper(), LEVELS['INFO'])
+_sample_rate = float(os.environ.get('LOG_SAMPLE_RATE', '0'))
+_request_sampled = contextvars.ContextVar('request_sampled', default=False)
+
+_SENSITIVE_KEYS = {'authorization', 'id_token', 'access_token', 'refresh_token', 'token', 'cookie', 'set-cookie'}
+_JWT_PATTERN = re.compile(r'eyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]*')
+
+
+def sample_request():
+    """decide whether the current request logs at debug level; call once per request"""
+    sampled = _sample_rate > 0 and random.random() < _sample_rate
+    _request_sampled.set(sampled)
+    return sampled
+
+
+def redact(value):
+    """
+    strip credentials from anything about to be logged
+
+    args:
+        value: str, dict or list (e.g. an api gateway event)
+
+    returns:
+        a redacted copy: sensitive keys masked, jwt-looking strings replaced
+    """
+    if isinstance(value, str):
+        return _JWT_PATTERN.sub('[REDACTED_JWT]', value)
+    if isinstance(value, dict):
+        return {
+            key: '[REDACTED]' if str(key).lower() in _SENSITIVE_KEYS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+class StructuredLogger:
+    """
+    logger.info("created order %s", order_id, user_id=user_id)
+    logger.debug("event: %s", lambda: json.dumps(event))  # callable only runs if emitted
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def is_enabled_for(self, level_name):
+        """would a record at this level be emitted for the current request?"""
+        return LEVELS[level_name] >= _min_level or _request_sampled.get()
+
+    def debug(self, message, *args, **fields):
+        self._log('DEBUG', message, args, fields)
+
+    def info(self, message, *args, **fields):
+        self._log('INFO', message, args, fields)
+
+    def warning(self, message, *args, **fields):
+        self._log('WARNING', message, args, fields)
+
+    def error(self, message, *args, **fields):
+        self._log('ERROR', message, args, fields)
+
+    def _log(self, level_name, message, args, fields):
+        if not self.is_enabled_for(level_name):
+            return
+
+        if args:
+            message = message % tuple(arg() if callable(arg) else arg for arg in args)
+
+        record = {'level': level_name, 'logger': self.name, 'message': redact(message)}
+        if fields:
+            record.update(redact(fields))
+        print(json.dumps(record, default=str))
+
+
+def get_logger(name):
+    """structured logger for a module"""
+    return StructuredLogger(name)
@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from utils.logger import get_logger, redact, sample_request
+
+# per-request stage timers, emitted once per request as a cloudwatch embedded metric
+# format (emf) line. stages can nest (a user lookup contains a dynamodb query), each
+# stage name accumulates its own total for the request
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'CognitoHop/ClientBackend')
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """metric values and properties collected for one request"""
+
+    def __init__(self, handler_name):
+        self.handler_name = handler_name
+        self.values = {}
+        self.counts = {}
+        self.properties = {}
+        self._lock = threading.Lock()  # speculative lookups record from worker threads
+
+    def add(self, name, value):
+        """add to a metric (stage timers accumulate)"""
+        with self._lock:
+            self.values[name] = self.values.get(name, 0.0) + value
+
+    def increment(self, name, value=1):
+        """count an event (fallbacks, dropped writes...)"""
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def set_property(self, name, value):
+        """non-metric context for the emf line (searchable in logs insights)"""
+        self.properties[name] = value
+
+    def to_emf(self):
+        """one emf json line for cloudwatch"""
+        metric_values = {f"{name}_ms": round(value, 3) for name, value in self.values.items()}
+        units = {name: 'Milliseconds' for name in metric_values}
+        for name, value in self.counts.items():
+            metric_values[name] = value
+            units[name] = 'Count'
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['Handler']],
+                    'Metrics': [{'Name': name, 'Unit': units[name]} for name in metric_values]
+                }]
+            },
+            'Handler': self.handler_name
+        }
+        record.update(self.properties)
+        record.update(metric_values)
+        return json.dumps(record, default=str)
+
+
+def current_metrics():
+    """metrics of the request running in this context, none outside a request"""
+    return _current.get()
+
+
+@contextmanager
+def stage(name):
+    """time a block of work as a stage of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.add(name, (time.perf_counter() - started) * 1000)
+
+
+def record(name, value_ms):
+    """record an already measured duration on the current request"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add(name, value_ms)
+
+
+def increment(name, value=1):
+    """count an event on the current request"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.increment(name, value)
+
+
+def instrumented(handler_name):
+    """
+    decorator for lambda handlers: per-request metrics + log sampling,
+    lazily formatted (and redacted) debug log of the event, emf line at the end
+    """
+    def decorator(handler):
+        logger = get_logger(handler_name)
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            metrics = RequestMetrics(handler_name)
+            token = _current.set(metrics)
+            sample_request()
+            logger.debug("request received: %s", lambda: json.dumps(redact(event)))
+
+            started = time.perf_counter()
+            try:
+                response = handler(event, context)
+                metrics.set_property('status_code', response.get('statusCode'))
+                return response
+            finally:
+                metrics.add('total', (time.perf_counter() - started) * 1000)
+                if METRICS_ENABLED:
+                    print(metrics.to_emf())
+                _current.reset(token)
+        return wrapper
+    return decorator
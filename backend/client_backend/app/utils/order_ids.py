@@ -0,0 +1,108 @@
+import os
+import time
+import threading
+from datetime import datetime, time as dt_time, timezone
+
+# new ids: "order_" + 26-char ulid (48-bit ms timestamp + 80 random bits, crockford base32).
+# legacy ids are "order-" + 8 random hex chars. "_" sorts after "-", so in one partition every
+# legacy order comes before every ulid order, but legacy orders are in random order among themselves
+ORDER_ID_PREFIX = 'order_'
+LEGACY_ORDER_ID_PREFIX = 'order-'
+
+_CROCKFORD = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_RANDOM_BITS = 80
+_MAX_RANDOM = (1 << _RANDOM_BITS) - 1
+
+_lock = threading.Lock()
+_last_timestamp_ms = -1
+_last_random = 0
+
+
+def _encode(value, length):
+    """crockford base32, fixed width so ids sort lexicographically"""
+    chars = []
+    for _ in range(length):
+        chars.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def generate_order_id(timestamp_ms=None):
+    """
+    generate a time-ordered order id
+
+    ids made in the same millisecond by this container increment the random
+    part instead of drawing a new one, so they still sort in creation order
+
+    args:
+        timestamp_ms (int, optional): creation time in epoch ms, defaults to now
+
+    returns:
+        str: order id like order_01JAB3X8Z6V7P4N2QK9RDT5M0C
+    """
+    global _last_timestamp_ms, _last_random
+
+    if timestamp_ms is None:
+        timestamp_ms = int(time.time() * 1000)
+
+    with _lock:
+        if timestamp_ms == _last_timestamp_ms and _last_random < _MAX_RANDOM:
+            _last_random += 1
+        else:
+            _last_timestamp_ms = timestamp_ms
+            _last_random = int.from_bytes(os.urandom(10), 'big')
+        random_part = _last_random
+
+    return f"{ORDER_ID_PREFIX}{_encode(timestamp_ms, 10)}{_encode(random_part, 16)}"
+
+
+def is_order_id(value):
+    """does value look like an order id (ulid or legacy)?"""
+    if not isinstance(value, str):
+        return False
+    if value.startswith(ORDER_ID_PREFIX):
+        return len(value) == len(ORDER_ID_PREFIX) + 26 and all(c in _CROCKFORD for c in value[len(ORDER_ID_PREFIX):])
+    if value.startswith(LEGACY_ORDER_ID_PREFIX):
+        suffix = value[len(LEGACY_ORDER_ID_PREFIX):]
+        return 0 < len(suffix) <= 36 and all(c in '0123456789abcdefABCDEF-' for c in suffix)
+    return False
+
+
+def order_id_lower_bound(moment):
+    """smallest possible order id created at `moment` (datetime)"""
+    return f"{ORDER_ID_PREFIX}{_encode(_to_epoch_ms(moment), 10)}{'0' * 16}"
+
+
+def order_id_upper_bound(moment):
+    """largest possible order id created at `moment` (datetime)"""
+    return f"{ORDER_ID_PREFIX}{_encode(_to_epoch_ms(moment), 10)}{'Z' * 16}"
+
+
+def _to_epoch_ms(moment):
+    """naive datetimes are treated as utc (lambda's local time)"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(int(moment.timestamp() * 1000), 0)
+
+
+def parse_date_bound(value, end_of_day=False):
+    """
+    parse a from/to query value
+
+    args:
+        value (str): iso date (2025-08-01) or datetime (2025-08-01T10:00:00Z)
+        end_of_day (bool): for plain dates, use 23:59:59.999 instead of midnight
+
+    returns:
+        datetime: parsed moment
+
+    raises:
+        ValueError: if the value isn't an iso date/datetime
+    """
+    try:
+        if len(value) == 10:
+            day = datetime.strptime(value, '%Y-%m-%d')
+            return datetime.combine(day.date(), dt_time.max if end_of_day else dt_time.min)
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"invalid date: {value} (use YYYY-MM-DD or an ISO-8601 datetime)")
@@ -1,33 +1,274 @@
+import os
+import gzip
 import json
+import base64
+import hashlib
+from decimal import Decimal
+from utils import metrics
+from utils.logger import get_logger
 
-def format_response(status_code, body):
+try:
+    import orjson  # optional, much faster encoder
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    import brotli  # optional, smaller than gzip for json
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+# how dynamodb Decimals are written: float (like before) or string (exact, e.g. "12.50")
+DECIMAL_MODE = os.environ.get('JSON_DECIMAL_MODE', 'float')
+# json encoder: auto (orjson when installed), orjson or stdlib
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+# bodies smaller than this go out uncompressed (negative disables compression)
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '5'))
+
+logger = get_logger('response_formatter')
+
+def _decimal_as_float(obj):
+    """json default hook: Decimal -> float while encoding"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _decimal_as_string(obj):
+    """json default hook: Decimal -> exact string while encoding"""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def to_json(body, decimal_mode=None, backend=None):
+    """
+    serialize a response body in one pass, converting Decimals as they are encoded
+    (no intermediate copy of the data)
+    
+    args:
+        body: response body (dicts/lists straight from dynamodb are fine)
+        decimal_mode (str, optional): 'float' or 'string', defaults to JSON_DECIMAL_MODE
+        backend (str, optional): 'orjson', 'stdlib' or 'auto', defaults to JSON_BACKEND
+        
+    returns:
+        str: json text
+    """
+    default = _decimal_as_string if (decimal_mode or DECIMAL_MODE) == 'string' else _decimal_as_float
+    backend = backend or JSON_BACKEND
+    
+    if backend == 'orjson' or (backend == 'auto' and HAS_ORJSON):
+        try:
+            return orjson.dumps(body, default=default).decode('utf-8')
+        except orjson.JSONEncodeError:
+            # e.g. ints beyond 64 bits, which orjson refuses; the stdlib encoder writes them exactly
+            pass
+    return json.dumps(body, default=default, separators=(',', ':'))
+
+def compute_etag(data):
+    """
+    strong etag for a response payload, without building the response body
+    
+    args:
+        data: what ends up in the response (orders, next_cursor, ...)
+        
+    returns:
+        str: quoted etag, e.g. "3f2a..."
+    """
+    # canonical form: sorted keys, exact decimals, plus the decimal mode since it changes the bytes sent.
+    # always the stdlib encoder: orjson writes non-ascii and floats differently (raw utf-8, 1e16 vs 1e+16),
+    # so hashing with whichever backend is installed would give one payload different etags per container
+    canonical = json.dumps(
+        data, default=_decimal_as_string, sort_keys=True, ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+    digest = hashlib.sha256(DECIMAL_MODE.encode('utf-8') + b'|' + canonical).hexdigest()
+    return f'"{digest[:32]}"'
+
+def etag_matches(if_none_match, etag):
+    """
+    does an If-None-Match header value match our etag? (weak comparison, as for GET)
+    
+    args:
+        if_none_match (str): header value, e.g. '"abc"', 'W/"abc", "def"' or '*'
+        etag (str): current quoted etag
+        
+    returns:
+        bool: true when a 304 can be sent
+    """
+    if not if_none_match or not etag:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def _serialize(body):
+    """to_json, timed as the serialization stage of the request"""
+    with metrics.stage('serialization'):
+        return to_json(body)
+
+def _get_header(headers, name):
+    """case-insensitive header lookup (api gateway passes them as the client sent them)"""
+    if not headers:
+        return None
+    value = headers.get(name)
+    if value is None:
+        lowered = name.lower()
+        for key, candidate in headers.items():
+            if key.lower() == lowered:
+                return candidate
+    return value
+
+def choose_encoding(accept_encoding):
+    """
+    pick a content encoding from an Accept-Encoding header
+    
+    args:
+        accept_encoding (str): header value, e.g. 'gzip, deflate, br;q=0.9'
+        
+    returns:
+        str: 'br', 'gzip', or none for identity
+    """
+    if not accept_encoding:
+        return None
+    
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    
+    wildcard = accepted.get('*', 0.0)
+    supported = ['br', 'gzip'] if HAS_BROTLI else ['gzip']
+    best, best_quality = None, 0.0
+    for coding in supported:
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+def _base_headers(headers=None):
+    base = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Credentials': True
+    }
+    if headers:
+        base.update(headers)
+    return base
+
+def format_response(status_code, body, headers=None, request_headers=None):
     """
     format a standard api gateway response
     
     args:
         status_code (int): http status code
         body (dict): response body
+        headers (dict, optional): extra response headers
+        request_headers (dict, optional): the request's headers; when given, bodies of at
+            least COMPRESSION_MIN_BYTES are compressed as the client's Accept-Encoding allows
         
     returns:
         dict: formatted response for api gateway
     """
-    return {
+    response = {
         'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Credentials': True
-        },
-        'body': json.dumps(body)
+        'headers': _base_headers(headers),
+        'body': _serialize(body)
     }
+    
+    if request_headers is not None and COMPRESSION_MIN_BYTES >= 0:
+        _negotiate_compression(response, request_headers)
+    
+    return response
+
+def _negotiated_encoding(request_headers):
+    """encoding a response to these request headers may be compressed with, none for identity only"""
+    if request_headers is None or COMPRESSION_MIN_BYTES < 0:
+        return None
+    return choose_encoding(_get_header(request_headers, 'Accept-Encoding'))
+
+def _weak_etag(etag):
+    return etag if etag.startswith('W/') else f"W/{etag}"
+
+def _negotiate_compression(response, request_headers):
+    """compress the response body in place if the client accepts it and it's big enough"""
+    response['headers']['Vary'] = 'Accept-Encoding'
+    
+    encoding = _negotiated_encoding(request_headers)
+    if encoding is None:
+        return
+    
+    # the bytes may differ per encoding, so the validator is only weakly comparable. decided
+    # on the request alone (not the body size), so a 304 can send the same etag without a body
+    etag = response['headers'].get('ETag')
+    if etag:
+        response['headers']['ETag'] = _weak_etag(etag)
+    
+    raw = response['body'].encode('utf-8')
+    if len(raw) < COMPRESSION_MIN_BYTES:
+        return
+    
+    with metrics.stage('compression'):
+        compressed = _compress(raw, encoding)
+        response['body'] = base64.b64encode(compressed).decode('ascii')
+    response['isBase64Encoded'] = True
+    response['headers']['Content-Encoding'] = encoding
 
-def success_response(data=None, message=None):
+def not_modified_response(etag, headers=None, request_headers=None):
+    """
+    304 for a conditional GET whose If-None-Match matched - no body is built or sent
+    
+    args:
+        etag (str): the etag the client already has
+        headers (dict, optional): extra response headers (e.g. Cache-Control)
+        request_headers (dict, optional): the request's headers; pass them when the 200 would
+            have been negotiated, so the 304 carries the same (weak) etag and Vary
+        
+    returns:
+        dict: formatted 304 response for api gateway
+    """
+    not_modified_headers = {'ETag': etag}
+    if request_headers is not None and COMPRESSION_MIN_BYTES >= 0:
+        not_modified_headers['Vary'] = 'Accept-Encoding'
+        if _negotiated_encoding(request_headers):
+            not_modified_headers['ETag'] = _weak_etag(etag)
+    if headers:
+        not_modified_headers.update(headers)
+    response_headers = _base_headers(not_modified_headers)
+    del response_headers['Content-Type']
+    return {
+        'statusCode': 304,
+        'headers': response_headers,
+        'body': ''
+    }
+
+def success_response(data=None, message=None, headers=None, request_headers=None):
     """
     format a successful response
     
     args:
         data (dict, optional): response data
         message (str, optional): success message
+        headers (dict, optional): extra response headers
+        request_headers (dict, optional): request headers, enables compression negotiation
         
     returns:
         dict: formatted success response
@@ -42,9 +283,9 @@ def success_response(data=None, message=None):
     if message is not None:
         body['message'] = message
         
-    return format_response(200, body)
+    return format_response(200, body, headers, request_headers)
 
-def error_response(status_code, message, error_code=None):
+def error_response(status_code, message, error_code=None, errors=None, headers=None):
     """
     format an error response
     
@@ -52,6 +293,8 @@ def error_response(status_code, message, error_code=None):
         status_code (int): http status code
         message (str): error message
         error_code (str, optional): error code
+        errors (list, optional): per-field problems, e.g. from a SchemaValidationError
+        headers (dict, optional): extra headers, e.g. Retry-After
         
     returns:
         dict: formatted error response
@@ -63,5 +306,39 @@ def error_response(status_code, message, error_code=None):
     
     if error_code is not None:
         body['error_code'] = error_code
+    
+    if errors is not None:
+        body['errors'] = errors
+        
+    return format_response(status_code, body, headers=headers)
+
+def service_unavailable_response(retry_after_seconds=1):
+    """
+    503 for when a dependency (dynamodb) is throttling, timing out or its circuit is open
+    
+    args:
+        retry_after_seconds (int): sent as Retry-After
         
-    return format_response(status_code, body) 
\ No newline at end of file
+    returns:
+        dict: formatted error response
+    """
+    return error_response(
+        status_code=503,
+        message="Service temporarily unavailable, please retry",
+        error_code="SERVICE_UNAVAILABLE",
+        headers={'Retry-After': str(retry_after_seconds)}
+    )
+
+def dynamodb_error_response(error):
+    """
+    503 for a dynamodb failure worth retrying - throttled, timed out or circuit open
+    (handlers catch RETRYABLE_ERRORS for this, every other error is a 500)
+    
+    args:
+        error (DynamoDBError): the typed error, its retry_after_seconds becomes Retry-After
+        
+    returns:
+        dict: formatted error response
+    """
+    logger.warning("dynamodb unavailable: %s", error)
+    return service_unavailable_response(error.retry_after_seconds)
@@ -0,0 +1,87 @@
+import time
+import threading
+from collections import OrderedDict
+
+class TTLCache:
+    """
+    small thread-safe lru cache where every entry carries its own expiry
+    meant for per-container caches that live as long as the lambda is warm
+    """
+
+    def __init__(self, max_size=1024, default_ttl_seconds=None):
+        """
+        initialize cache
+
+        args:
+            max_size (int): max entries kept, least recently used are evicted first
+            default_ttl_seconds (float, optional): ttl used when set() gets no expiry
+        """
+        self.max_size = max_size
+        self.default_ttl_seconds = default_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        get a cached value
+
+        args:
+            key: cache key
+            default: returned on miss or expiry (use a sentinel to cache none values)
+
+        returns:
+            cached value, or default
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl_seconds=None, expires_at=None):
+        """
+        cache a value
+
+        args:
+            key: cache key
+            value: value to cache
+            ttl_seconds (float, optional): seconds until the entry expires
+            expires_at (float, optional): absolute epoch expiry, wins over ttl_seconds
+        """
+        if expires_at is None:
+            ttl = ttl_seconds if ttl_seconds is not None else self.default_ttl_seconds
+            expires_at = time.time() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """drop one key, or everything when key is none"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """hit/miss counters for logging"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+    def __len__(self):
+        return len(self._entries)
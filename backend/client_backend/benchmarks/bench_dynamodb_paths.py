@@ -0,0 +1,105 @@
+"""
+benchmark: DynamoDBService resource path vs low-level client path
+
+    python benchmarks/bench_dynamodb_paths.py [--orders 2000] [--repeat 5]
+
+1. end to end: read every order of one user through query_orders_by_user on each
+   api mode, against moto's in-process dynamodb
+2. decode only: boto3's TypeDeserializer vs dynamodb_codec on the same wire items,
+   which isolates the part moto's own overhead would otherwise hide
+3. same responses: both modes must serialize to byte-identical json (and etags) under
+   every JSON_DECIMAL_MODE; exits 1 when they don't
+"""
+import sys
+import json
+import time
+import argparse
+
+from fixtures import configure_aws_env, create_tables, seed_user
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from moto import mock_aws
+
+from services.aws.dynamodb_codec import deserialize_item
+from services.aws.dynamodb_service import DynamoDBService
+from utils.response_formatter import to_json, compute_etag
+
+
+def _best_ms(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    configure_aws_env()
+    with mock_aws():
+        create_tables(boto3.client('dynamodb'))
+        seed_user(boto3.resource('dynamodb'), 'user-bench', 'sub-bench', args.orders)
+
+        resource_service = DynamoDBService(api_mode='resource')
+        client_service = DynamoDBService(api_mode='client')
+        assert len(client_service.query_orders_by_user('user-bench')) == args.orders
+
+        resource_orders = resource_service.query_orders_by_user('user-bench')
+        client_orders = client_service.query_orders_by_user('user-bench')
+        identical_responses = {
+            mode: to_json(resource_orders, decimal_mode=mode) == to_json(client_orders, decimal_mode=mode)
+            for mode in ('float', 'string')
+        }
+        identical_responses['etag'] = compute_etag(resource_orders) == compute_etag(client_orders)
+
+        end_to_end = {
+            'resource': _best_ms(lambda: resource_service.query_orders_by_user('user-bench'), args.repeat),
+            'client': _best_ms(lambda: client_service.query_orders_by_user('user-bench'), args.repeat)
+        }
+
+        wire_items = []
+        start_key = None
+        while True:
+            kwargs = {'TableName': client_service.orders_table_name}
+            if start_key:
+                kwargs['ExclusiveStartKey'] = start_key
+            response = client_service.client.scan(**kwargs)
+            wire_items.extend(response['Items'])
+            start_key = response.get('LastEvaluatedKey')
+            if not start_key:
+                break
+
+    type_deserializer = TypeDeserializer()
+
+    def boto3_decode():
+        for item in wire_items:
+            {key: type_deserializer.deserialize(value) for key, value in item.items()}
+
+    def codec_decode():
+        for item in wire_items:
+            deserialize_item(item)
+
+    decode_only = {
+        'boto3_type_deserializer': _best_ms(boto3_decode, args.repeat),
+        'dynamodb_codec': _best_ms(codec_decode, args.repeat)
+    }
+
+    print(json.dumps({
+        'orders': args.orders,
+        'query_all_orders_ms': end_to_end,
+        'decode_only_ms': decode_only,
+        'decode_speedup': round(decode_only['boto3_type_deserializer'] / decode_only['dynamodb_codec'], 2),
+        'identical_responses': identical_responses
+    }, indent=2))
+    if not all(identical_responses.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+load test: the real get_orders / create_order handlers, in-process, against local stand-ins
+
+    python benchmarks/bench_handlers.py [--users 20] [--orders 50] [--requests 500]
+                                        [--concurrency 8] [--output results.json]
+
+synthetic users (each with --orders orders) live in moto's dynamodb, id tokens are
+signed with a generated rsa key served by a local jwks endpoint. per handler:
+
+1. cold: first request after the service container and dynamodb transport are
+   reset (services rebuilt, jwks downloaded, connections opened), --cold-samples times
+2. warm: --requests sequential requests, round robin over the users
+3. concurrent: --requests requests from a --concurrency thread pool, throughput
+4. memory: tracemalloc peak over a concurrent run (separate pass, tracemalloc is slow)
+
+everything is printed as one json document (and written to --output) so runs on
+different commits can be diffed. moto adds its own overhead to every dynamodb call,
+so compare numbers between commits, not against production latencies. moto's dynamodb
+handles one request at a time here (it isn't thread safe), so concurrent runs measure
+the handlers' own concurrency, not dynamodb's.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import subprocess
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# quiet app logging before any app module reads it
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+os.environ.setdefault('METRICS_ENABLED', 'false')
+os.environ.setdefault('PRIME_ON_INIT', 'false')
+
+from fixtures import (
+    APP_DIR, LocalJWKSServer, SigningKey, configure_aws_env, configure_cognito_env, create_tables, seed_user,
+    serialize_moto_dynamodb
+)
+
+import boto3
+from moto import mock_aws
+
+HANDLERS_DIR = os.path.join(APP_DIR, 'handlers', 'http')
+HANDLER_NAMES = ('get_orders', 'create_order')
+
+
+def _percentile(sorted_values, percent):
+    """nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(percent / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies_ms):
+    """count / mean / p50 / p95 / p99 / max of a list of latencies"""
+    values = sorted(latencies_ms)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values), 3),
+        'p50_ms': round(_percentile(values, 50), 3),
+        'p95_ms': round(_percentile(values, 95), 3),
+        'p99_ms': round(_percentile(values, 99), 3),
+        'max_ms': round(values[-1], 3)
+    }
+
+
+class Workload:
+    """synthetic users, their tokens and the api gateway events sent for them"""
+
+    def __init__(self, signing_key, users, page_size):
+        self.users = [(f"user-bench-{i}", f"sub-bench-{i}") for i in range(users)]
+        self.tokens = [signing_key.mint_id_token(sub) for _, sub in self.users]
+        self.page_size = page_size
+
+    def event(self, handler_name, i):
+        """event for request number i (users are picked round robin)"""
+        token = self.tokens[i % len(self.tokens)]
+        event = {'headers': {'Authorization': f"Bearer {token}"}, 'queryStringParameters': None, 'body': None}
+        if handler_name == 'get_orders':
+            event['queryStringParameters'] = {'limit': str(self.page_size)}
+        else:
+            event['body'] = json.dumps({'item_name': f"bench item {i}", 'quantity': i % 5 + 1, 'price_per_item': 149.75})
+        return event
+
+
+def _timed_call(handler, event):
+    started = time.perf_counter()
+    response = handler(event, None)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if response['statusCode'] != 200:
+        raise RuntimeError(f"handler returned {response['statusCode']}: {response['body']}")
+    return elapsed_ms
+
+
+def _reset_container():
+    """what a new lambda container starts with (module imports aside)"""
+    from services import container
+    from services.aws import dynamodb_transport
+    container.reset()
+    dynamodb_transport.reset()
+
+
+def measure_cold(handler, handler_name, workload, samples):
+    latencies = []
+    for i in range(samples):
+        _reset_container()
+        latencies.append(_timed_call(handler, workload.event(handler_name, i)))
+    return summarize(latencies)
+
+
+def measure_warm(handler, handler_name, workload, requests):
+    _timed_call(handler, workload.event(handler_name, 0))
+    return summarize([_timed_call(handler, workload.event(handler_name, i)) for i in range(requests)])
+
+
+def measure_concurrent(handler, handler_name, workload, requests, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # every user's token verified and identity cached once, like a busy container
+        list(pool.map(lambda i: _timed_call(handler, workload.event(handler_name, i)), range(len(workload.users))))
+
+        started = time.perf_counter()
+        latencies = list(pool.map(lambda i: _timed_call(handler, workload.event(handler_name, i)), range(requests)))
+        wall_seconds = time.perf_counter() - started
+
+    result = summarize(latencies)
+    result['concurrency'] = concurrency
+    result['wall_seconds'] = round(wall_seconds, 3)
+    result['throughput_rps'] = round(requests / wall_seconds, 1)
+    return result
+
+
+def measure_memory(handler, handler_name, workload, requests, concurrency):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda i: handler(workload.event(handler_name, i), None), range(requests)))
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'requests': requests,
+        'peak_kb_above_baseline': round((peak - baseline) / 1024, 1),
+        'retained_kb_after_run': round((current - baseline) / 1024, 1)
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(args):
+    signing_key = SigningKey()
+    configure_aws_env()
+    serialize_moto_dynamodb()
+
+    with LocalJWKSServer([signing_key]) as jwks_server, mock_aws():
+        configure_cognito_env(jwks_server.url)
+        create_tables(boto3.client('dynamodb'))
+        dynamodb_resource = boto3.resource('dynamodb')
+        workload = Workload(signing_key, args.users, args.page_size)
+        for user_id, sub in workload.users:
+            seed_user(dynamodb_resource, user_id, sub, order_count=args.orders)
+
+        sys.path.insert(0, HANDLERS_DIR)
+        results = {}
+        for handler_name in args.handlers:
+            started = time.perf_counter()
+            handler = __import__(handler_name).handler
+            import_ms = (time.perf_counter() - started) * 1000
+
+            results[handler_name] = {
+                'first_import_ms': round(import_ms, 2),
+                'cold': measure_cold(handler, handler_name, workload, args.cold_samples),
+                'warm': measure_warm(handler, handler_name, workload, args.requests),
+                'concurrent': measure_concurrent(handler, handler_name, workload, args.requests, args.concurrency),
+                'memory': measure_memory(handler, handler_name, workload, args.memory_requests, args.concurrency)
+            }
+
+        jwks_downloads = jwks_server.request_count
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'dynamodb_api_mode': os.environ.get('DYNAMODB_API_MODE', 'resource'),
+            'speculative_user_lookup': os.environ.get('SPECULATIVE_USER_LOOKUP', 'false'),
+            'users': args.users,
+            'orders_per_user': args.orders,
+            'page_size': args.page_size,
+            'jwks_downloads': jwks_downloads,
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        },
+        'handlers': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--handlers', nargs='+', choices=HANDLER_NAMES, default=list(HANDLER_NAMES))
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--orders', type=int, default=50, help='orders seeded per user')
+    parser.add_argument('--page-size', type=int, default=50, help='?limit= for get_orders')
+    parser.add_argument('--requests', type=int, default=500, help='requests per warm / concurrent run')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--cold-samples', type=int, default=5)
+    parser.add_argument('--memory-requests', type=int, default=100)
+    parser.add_argument('--output', help='also write the json report here')
+    args = parser.parse_args()
+
+    # the handlers print (errors, emf when enabled); keep stdout for the report
+    real_stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        report = run(args)
+    finally:
+        sys.stdout = real_stdout
+
+    document = json.dumps(report, indent=2)
+    print(document)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(document + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+micro-benchmark: rs256 id token verifies/sec per JWTService backend
+
+    python benchmarks/bench_jwt_verify.py [--seconds 2]
+
+compares the original path (python-jose with a raw jwk dict, key rebuilt per call)
+against the pre-parsed jose key and the cryptography backend. keys are generated
+locally, nothing touches the network.
+"""
+import argparse
+import json
+import time
+
+from fixtures import APP_CLIENT_ID, ISSUER, SigningKey
+
+from jose import jwt
+from services.auth.token_verifiers import CryptographyVerifier, JoseVerifier
+
+
+def _rate(fn, seconds):
+    """call fn repeatedly for ~seconds and return calls/sec"""
+    fn()  # warm up
+    calls = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        calls += 1
+    return calls / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=2.0, help='time spent per backend')
+    args = parser.parse_args()
+
+    signing_key = SigningKey()
+    jwk_dict = signing_key.jwk()
+    token = signing_key.mint_id_token('bench-user')
+
+    def jose_raw_jwk():
+        jwt.decode(token, jwk_dict, algorithms=['RS256'], audience=APP_CLIENT_ID, issuer=ISSUER)
+
+    jose_verifier = JoseVerifier()
+    jose_key = jose_verifier.prepare_key(jwk_dict)
+
+    def jose_prepared():
+        jose_verifier.verify(token, jose_key, audience=APP_CLIENT_ID, issuer=ISSUER)
+
+    crypto_verifier = CryptographyVerifier()
+    crypto_key = crypto_verifier.prepare_key(jwk_dict)
+
+    def cryptography_prepared():
+        crypto_verifier.verify(token, crypto_key, audience=APP_CLIENT_ID, issuer=ISSUER)
+
+    results = {}
+    for name, fn in [('jose_raw_jwk', jose_raw_jwk),
+                     ('jose_prepared_key', jose_prepared),
+                     ('cryptography_prepared_key', cryptography_prepared)]:
+        results[name] = round(_rate(fn, args.seconds), 1)
+
+    baseline = results['jose_raw_jwk']
+    print(json.dumps({
+        'verifies_per_sec': results,
+        'speedup_vs_jose_raw_jwk': {name: round(rate / baseline, 2) for name, rate in results.items()}
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+benchmark: GET /orders response serialization over synthetic dynamodb orders
+
+    python benchmarks/bench_serialization.py [--sizes 1000 10000] [--repeat 5]
+
+compares the old two-step path (recursive Decimal -> float copy, then json.dumps)
+with response_formatter.to_json on the stdlib and orjson encoders. reports the best
+wall time and the peak traced memory of one serialization.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from decimal import Decimal
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+from utils.order_ids import generate_order_id
+from utils.response_formatter import HAS_ORJSON, to_json
+
+
+def make_orders(count):
+    """orders shaped like resource-layer query results (numbers as Decimal)"""
+    orders = []
+    for i in range(count):
+        order_id = generate_order_id()
+        price = Decimal('149.75') + i % 100
+        orders.append({
+            'PK': 'user-9fef7f58',
+            'SK': order_id,
+            'user_id': 'user-9fef7f58',
+            'order_id': order_id,
+            'item_name': f"item {i}",
+            'quantity': Decimal(i % 5 + 1),
+            'price_per_item': price,
+            'total_price': price * (i % 5 + 1),
+            'currency': 'PHP',
+            'status': 'pending',
+            'created_at': '2025-08-04T10:15:30.123456'
+        })
+    return orders
+
+
+def _legacy_convert(obj):
+    """the recursive copy get_orders used to do before serializing"""
+    if isinstance(obj, list):
+        return [_legacy_convert(item) for item in obj]
+    elif isinstance(obj, dict):
+        return {key: _legacy_convert(value) for key, value in obj.items()}
+    elif isinstance(obj, Decimal):
+        return float(obj)
+    return obj
+
+
+def _measure(fn, repeat):
+    """best wall time (ms) over repeat runs + peak traced memory (kb) of one run"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'ms': round(best * 1000, 2), 'peak_kb': round(peak / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        body = {'success': True, 'data': {'orders': make_orders(size)}}
+
+        candidates = {
+            'legacy_convert_then_dumps': lambda: json.dumps(
+                {'success': True, 'data': {'orders': _legacy_convert(body['data']['orders'])}}
+            ),
+            'to_json_stdlib': lambda: to_json(body, backend='stdlib'),
+            'to_json_stdlib_decimal_string': lambda: to_json(body, decimal_mode='string', backend='stdlib'),
+        }
+        if HAS_ORJSON:
+            candidates['to_json_orjson'] = lambda: to_json(body, backend='orjson')
+
+        results[str(size)] = {name: _measure(fn, args.repeat) for name, fn in candidates.items()}
+
+    print(json.dumps({'orjson_installed': HAS_ORJSON, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+"""
+fault injection: the real handlers against moto, with dynamodb calls made to fail or stall
+
+    python benchmarks/fault_injection.py [--api-mode resource|client] [--output report.json]
+
+faults are injected with botocore `before-call` hooks on the container's shared clients,
+so they hit exactly where DynamoDBService talks to dynamodb (botocore's own retries are
+turned off, the resilience layer is what's being exercised). scenarios:
+
+1. transient throttling: the first queries are throttled, the request still succeeds
+2. persistent throttling: 503 + Retry-After (never "user not found"), the breaker opens,
+   further requests fail fast without calling dynamodb, then recover via half open
+3. timeouts: a read timeout comes back as 503, not 500 or an empty page
+4. batch writes: every chunk failing is a 503, not a list of failed orders
+5. hedged reads: with DDB_HEDGED_READS=true a stalled query is answered by the hedge
+6. late order: an order older than the summary's last order takes the fallback transaction
+   (its own ClientRequestToken, which moto checks against dynamodb's 36 character limit)
+
+every check is printed as json; the exit status is 1 when any check failed.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from types import SimpleNamespace
+
+os.environ.setdefault('LOG_LEVEL', 'CRITICAL')
+os.environ.setdefault('METRICS_ENABLED', 'false')
+os.environ.setdefault('PRIME_ON_INIT', 'false')
+# only the resilience layer retries, every cache that could hide a fault is off
+os.environ['DDB_MAX_ATTEMPTS'] = '1'
+os.environ['ORDERS_CACHE_TTL_SECONDS'] = '0'
+os.environ['DDB_THROTTLE_BACKOFF_BASE_SECONDS'] = '0.01'
+os.environ['DDB_BATCH_MAX_RETRIES'] = '0'
+
+from fixtures import APP_DIR, LocalJWKSServer, SigningKey, configure_aws_env, configure_cognito_env, create_tables, seed_user
+
+import boto3
+from moto import mock_aws
+
+HANDLERS_DIR = os.path.join(APP_DIR, 'handlers', 'http')
+
+
+class FaultInjector:
+    """
+    botocore before-call hook: answers matching dynamodb calls with an error, raises
+    an exception, or stalls them, for the next `times` matching calls
+    """
+
+    def __init__(self):
+        self._faults = []
+        self._lock = threading.Lock()
+        self.calls = {}
+
+    def attach(self):
+        """hook into every client of the container's dynamodb transport"""
+        from services.aws import dynamodb_transport
+        for profile in dynamodb_transport.PROFILES:
+            for client in (dynamodb_transport.get_dynamodb_client(profile),
+                           dynamodb_transport.get_dynamodb_resource(profile).meta.client):
+                client.meta.events.register('before-parameter-build.dynamodb', self._remember_table)
+                client.meta.events.register('before-call.dynamodb', self._before_call)
+
+    def add(self, operation, times=None, error_code=None, exception=None, delay_seconds=None, table=None):
+        """fail (error_code / exception) or stall (delay_seconds) the next `times` calls, every call when none"""
+        with self._lock:
+            self._faults.append({
+                'operation': operation, 'table': table, 'remaining': times,
+                'error_code': error_code, 'exception': exception, 'delay_seconds': delay_seconds
+            })
+
+    def clear(self):
+        with self._lock:
+            self._faults.clear()
+            self.calls.clear()
+
+    def _take(self, operation, table):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            for fault in self._faults:
+                if fault['operation'] != operation or fault['table'] not in (None, table):
+                    continue
+                if fault['remaining'] is not None:
+                    if fault['remaining'] <= 0:
+                        continue
+                    fault['remaining'] -= 1
+                return fault
+        return None
+
+    def _remember_table(self, params, context, **kwargs):
+        # before-call only sees the serialized request, so note the table while params are still plain
+        context['fault_injection_table'] = params.get('TableName')
+
+    def _before_call(self, model, context, **kwargs):
+        fault = self._take(model.name, context.get('fault_injection_table'))
+        if fault is None:
+            return None
+        if fault['delay_seconds']:
+            time.sleep(fault['delay_seconds'])
+            return None  # then the real call goes ahead
+        if fault['exception']:
+            raise fault['exception']
+        # short-circuits the request, botocore raises the matching ClientError
+        http = SimpleNamespace(status_code=400, headers={}, content=b'')
+        return http, {
+            'Error': {'Code': fault['error_code'], 'Message': 'injected fault'},
+            'ResponseMetadata': {'HTTPStatusCode': 400}
+        }
+
+
+class Harness:
+    """handlers, users and the injector for one run"""
+
+    def __init__(self, signing_key, injector):
+        self.signing_key = signing_key
+        self.injector = injector
+        self.results = []
+        self._user_count = 0
+        self.handlers = {}
+        sys.path.insert(0, HANDLERS_DIR)
+        for name in ('get_orders', 'create_order', 'create_orders_batch'):
+            self.handlers[name] = __import__(name).handler
+
+    def fresh_container(self, **env):
+        """new services with the given env (the resilience settings are read at build time)"""
+        from services import container
+        from services.aws import dynamodb_transport
+        from services.aws.dynamodb_resilience import reset_breakers
+        for name in [name for name in os.environ if name.startswith(('DDB_HEDGE', 'DDB_BREAKER', 'DDB_THROTTLE_RETRIES'))]:
+            del os.environ[name]
+        os.environ.update(env)
+        container.reset()
+        dynamodb_transport.reset()
+        reset_breakers()
+        self.injector.clear()
+        self.injector.attach()
+
+    def new_user(self, orders=5):
+        """a user nobody has looked up yet (so the identity cache can't answer for dynamodb)"""
+        self._user_count += 1
+        user_id, sub = f"user-fault-{self._user_count}", f"sub-fault-{self._user_count}"
+        self.last_user_id = user_id
+        seed_user(boto3.resource('dynamodb'), user_id, sub, order_count=orders)
+        return self.signing_key.mint_id_token(sub)
+
+    def call(self, handler_name, token, body=None, query=None):
+        event = {
+            'headers': {'Authorization': f"Bearer {token}"},
+            'queryStringParameters': query,
+            'body': json.dumps(body) if body is not None else None
+        }
+        started = time.perf_counter()
+        response = self.handlers[handler_name](event, None)
+        response['elapsed_ms'] = (time.perf_counter() - started) * 1000
+        response['json'] = json.loads(response['body']) if response.get('body') else None
+        return response
+
+    def check(self, scenario, name, passed, **detail):
+        self.results.append({'scenario': scenario, 'check': name, 'passed': bool(passed), **detail})
+
+
+def transient_throttling(h):
+    h.fresh_container(DDB_THROTTLE_RETRIES='2')
+    token = h.new_user()
+    h.injector.add('Query', times=2, error_code='ProvisionedThroughputExceededException')
+
+    response = h.call('get_orders', token)
+    h.check('transient_throttling', 'request succeeds after retries', response['statusCode'] == 200,
+            status=response['statusCode'], query_calls=h.injector.calls.get('Query'))
+    h.check('transient_throttling', 'all orders returned', response['json']['data']['total_orders'] == 5)
+
+
+def persistent_throttling(h):
+    from services.aws.dynamodb_resilience import get_breaker
+    from fixtures import MAIN_TABLE
+
+    h.fresh_container(DDB_THROTTLE_RETRIES='1', DDB_BREAKER_FAILURE_THRESHOLD='3', DDB_BREAKER_RESET_SECONDS='0.5')
+    token = h.new_user()
+    h.injector.add('Query', error_code='ThrottlingException', table=MAIN_TABLE)
+
+    statuses = [h.call('get_orders', token) for _ in range(3)]
+    h.check('persistent_throttling', '503 with retry-after, not 401 user not found',
+            all(r['statusCode'] == 503 and r['headers'].get('Retry-After') for r in statuses),
+            statuses=[r['statusCode'] for r in statuses],
+            error_codes=[(r['json'] or {}).get('error_code') for r in statuses])
+    h.check('persistent_throttling', 'breaker opened', get_breaker(MAIN_TABLE).state == 'open')
+
+    calls_before = h.injector.calls.get('Query', 0)
+    response = h.call('get_orders', token)
+    h.check('persistent_throttling', 'open breaker fails fast without calling dynamodb',
+            response['statusCode'] == 503 and h.injector.calls.get('Query', 0) == calls_before,
+            elapsed_ms=round(response['elapsed_ms'], 2))
+
+    h.injector.clear()
+    time.sleep(0.6)
+    response = h.call('get_orders', token)
+    h.check('persistent_throttling', 'half open trial succeeds and closes the breaker',
+            response['statusCode'] == 200 and get_breaker(MAIN_TABLE).state == 'closed',
+            status=response['statusCode'])
+
+
+def timeouts(h):
+    from botocore.exceptions import ReadTimeoutError
+
+    h.fresh_container()
+    token = h.new_user()
+    h.call('get_orders', token)  # user lookup cached, the orders query is what times out
+    h.injector.add('Query', exception=ReadTimeoutError(endpoint_url='http://dynamodb.local'))
+
+    response = h.call('get_orders', token)
+    h.check('timeouts', 'read timeout is a 503, not an empty page', response['statusCode'] == 503,
+            status=response['statusCode'], body=response['json'])
+
+    h.injector.clear()
+    h.injector.add('PutItem', exception=ReadTimeoutError(endpoint_url='http://dynamodb.local'))
+    h.injector.add('TransactWriteItems', exception=ReadTimeoutError(endpoint_url='http://dynamodb.local'))
+    response = h.call('create_order', token, body={'item_name': 'x', 'quantity': 1, 'price_per_item': 1})
+    h.check('timeouts', 'write timeout is a 503', response['statusCode'] == 503, status=response['statusCode'])
+
+
+def batch_outage(h):
+    h.fresh_container(DDB_THROTTLE_RETRIES='0')
+    token = h.new_user(orders=0)
+    h.call('get_orders', token)
+    h.injector.add('BatchWriteItem', error_code='ServiceUnavailable')
+
+    orders = [{'item_name': f"x{i}", 'quantity': 1, 'price_per_item': 1} for i in range(30)]
+    response = h.call('create_orders_batch', token, body={'orders': orders})
+    h.check('batch_outage', 'every chunk failing is a 503', response['statusCode'] == 503,
+            status=response['statusCode'], batch_calls=h.injector.calls.get('BatchWriteItem'))
+
+    h.injector.clear()
+    h.injector.add('BatchWriteItem', times=1, error_code='ServiceUnavailable')
+    response = h.call('create_orders_batch', token, body={'orders': orders})
+    data = (response['json'] or {}).get('data') or {}
+    h.check('batch_outage', 'one failed chunk is reported per order', response['statusCode'] == 200
+            and data.get('created_count') == 5 and data.get('failed_count') == 25,
+            status=response['statusCode'], created=data.get('created_count'))
+
+
+def hedged_reads(h):
+    h.fresh_container(DDB_HEDGED_READS='true', DDB_HEDGE_MIN_DELAY_MS='20')
+    token = h.new_user()
+    for _ in range(30):  # latency samples for the p95
+        h.call('get_orders', token)
+
+    from services import container
+    delay_ms = container.get_dynamodb_service().resilience.hedge_delay_ms('query')
+    h.injector.add('Query', times=1, delay_seconds=1.0)
+    response = h.call('get_orders', token)
+    h.check('hedged_reads', 'stalled query answered by the hedge',
+            response['statusCode'] == 200 and response['elapsed_ms'] < 1000,
+            hedge_delay_ms=round(delay_ms, 2), elapsed_ms=round(response['elapsed_ms'], 2),
+            query_calls=h.injector.calls.get('Query'))
+
+
+def late_order(h):
+    from fixtures import ORDERS_TABLE
+
+    h.fresh_container(ORDER_SUMMARIES_ENABLED='true')
+    token = h.new_user(orders=0)
+    newer_order_id = 'order_ZZZZZZZZZZZZZZZZZZZZZZZZZZ'
+    summaries = boto3.resource('dynamodb').Table(ORDERS_TABLE)
+    summaries.put_item(Item={
+        'PK': h.last_user_id, 'SK': 'summary', 'order_count': 1,
+        'last_order_at': '2999-01-01T00:00:00', 'last_order_id': newer_order_id
+    })
+
+    response = h.call('create_order', token, body={'item_name': 'x', 'quantity': 1, 'price_per_item': 1})
+    summary = summaries.get_item(Key={'PK': h.last_user_id, 'SK': 'summary'}).get('Item', {})
+    h.check('late_order', 'order older than the last order is written', response['statusCode'] == 200,
+            status=response['statusCode'], body=response['json'])
+    h.check('late_order', 'counted without replacing the last order',
+            summary.get('order_count') == 2 and summary.get('last_order_id') == newer_order_id,
+            order_count=summary.get('order_count'), last_order_id=summary.get('last_order_id'))
+
+
+SCENARIOS = (transient_throttling, persistent_throttling, timeouts, batch_outage, hedged_reads, late_order)
+
+
+def run(args):
+    if args.api_mode:
+        os.environ['DYNAMODB_API_MODE'] = args.api_mode
+    signing_key = SigningKey()
+    configure_aws_env()
+
+    with LocalJWKSServer([signing_key]) as jwks_server, mock_aws():
+        configure_cognito_env(jwks_server.url)
+        create_tables(boto3.client('dynamodb'))
+        harness = Harness(signing_key, FaultInjector())
+        for scenario in SCENARIOS:
+            if args.scenarios and scenario.__name__ not in args.scenarios:
+                continue
+            scenario(harness)
+    return harness.results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--api-mode', choices=('resource', 'client'))
+    parser.add_argument('--scenarios', nargs='+', choices=[scenario.__name__ for scenario in SCENARIOS])
+    parser.add_argument('--output', help='also write the json report here')
+    args = parser.parse_args()
+
+    # the handlers print (logs, emf when enabled); keep stdout for the report
+    real_stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        results = run(args)
+    finally:
+        sys.stdout = real_stdout
+
+    report = {'passed': all(result['passed'] for result in results), 'checks': results}
+    document = json.dumps(report, indent=2, default=str)
+    print(document)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(document + '\n')
+    sys.exit(0 if report['passed'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""
+local stand-ins shared by the benchmark scripts
+rsa keypair + token minting and a tiny http server acting as cognito's jwks endpoint
+"""
+import os
+import sys
+import json
+import time
+import base64
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+# make app modules importable the same way the handlers do
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+USER_POOL_ID = 'ap-southeast-2_bench'
+APP_CLIENT_ID = 'bench-client'
+REGION = 'ap-southeast-2'
+ISSUER = f"https://cognito-idp.{REGION}.amazonaws.com/{USER_POOL_ID}"
+
+
+def _b64url(data):
+    """base64url without padding, like jwt uses"""
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _int_to_b64url(value):
+    """encode a jwk integer member (n, e)"""
+    return _b64url(value.to_bytes((value.bit_length() + 7) // 8, 'big'))
+
+
+class SigningKey:
+    """locally generated rsa keypair that signs cognito-shaped id tokens"""
+
+    def __init__(self, kid='bench-key-1', key_size=2048):
+        self.kid = kid
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+
+    def jwk(self):
+        """public half as a jwk, the way cognito publishes it"""
+        numbers = self.private_key.public_key().public_numbers()
+        return {
+            'alg': 'RS256',
+            'e': _int_to_b64url(numbers.e),
+            'kid': self.kid,
+            'kty': 'RSA',
+            'n': _int_to_b64url(numbers.n),
+            'use': 'sig'
+        }
+
+    def mint_id_token(self, sub, ttl_seconds=3600, **extra_claims):
+        """sign an rs256 id token for this user pool"""
+        now = int(time.time())
+        claims = {
+            'sub': sub,
+            'aud': APP_CLIENT_ID,
+            'iss': ISSUER,
+            'token_use': 'id',
+            'email': f"{sub}@example.com",
+            'email_verified': True,
+            'iat': now,
+            'exp': now + ttl_seconds
+        }
+        claims.update(extra_claims)
+
+        header = {'alg': 'RS256', 'kid': self.kid, 'typ': 'JWT'}
+        signing_input = (
+            _b64url(json.dumps(header, separators=(',', ':')).encode('utf-8')) + '.' +
+            _b64url(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+        )
+        signature = self.private_key.sign(signing_input.encode('ascii'), padding.PKCS1v15(), hashes.SHA256())
+        return f"{signing_input}.{_b64url(signature)}"
+
+
+class LocalJWKSServer:
+    """
+    serves {"keys": [...]} on 127.0.0.1 like cognito's .well-known/jwks.json
+    use as a context manager; .url is what COGNITO_JWKS_URL should point at
+    """
+
+    def __init__(self, signing_keys):
+        self.signing_keys = list(signing_keys)
+        self.request_count = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}/.well-known/jwks.json"
+
+    def _make_handler(self):
+        jwks_server = self
+
+        class JWKSHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                jwks_server.request_count += 1
+                body = json.dumps({'keys': [key.jwk() for key in jwks_server.signing_keys]}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep benchmark output clean
+
+        return JWKSHandler
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def configure_cognito_env(jwks_url, jwks_cache_path=None):
+    """point JWTService at the local stand-in"""
+    os.environ['COGNITO_USER_POOL_ID'] = USER_POOL_ID
+    os.environ['COGNITO_APP_CLIENT_ID'] = APP_CLIENT_ID
+    os.environ['AWS_REGION'] = REGION
+    os.environ['COGNITO_JWKS_URL'] = jwks_url
+    os.environ['JWKS_CACHE_PATH'] = jwks_cache_path or ''
+
+
+MAIN_TABLE = 'bench-main'
+ORDERS_TABLE = 'bench-orders'
+USER_SUB_INDEX = 'user-sub-index'
+
+
+def configure_aws_env():
+    """fake credentials + table names so nothing can reach a real account"""
+    os.environ['AWS_DEFAULT_REGION'] = REGION
+    os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+    os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+    os.environ['AWS_SESSION_TOKEN'] = 'testing'
+    os.environ['MAIN_TABLE'] = MAIN_TABLE
+    os.environ['ORDERS_TABLE'] = ORDERS_TABLE
+    os.environ['USER_SUB_INDEX'] = USER_SUB_INDEX
+
+
+_moto_dynamodb_lock = threading.Lock()
+
+
+def serialize_moto_dynamodb():
+    """
+    run moto's dynamodb requests one at a time. its in-memory backend isn't thread safe
+    (concurrent TransactWriteItems race inside its deepcopy of the table), which real
+    dynamodb doesn't have to worry about; client-side work still runs concurrently
+    """
+    from moto.dynamodb.responses import DynamoHandler
+    if getattr(DynamoHandler.call_action, 'serialized', False):
+        return
+    call_action = DynamoHandler.call_action
+
+    def serialized_call_action(self):
+        with _moto_dynamodb_lock:
+            return call_action(self)
+    serialized_call_action.serialized = True
+    DynamoHandler.call_action = serialized_call_action
+
+
+def create_tables(dynamodb_client):
+    """main table (with the sub gsi) + orders table, same key schema as the deployed ones"""
+    key_schema = [
+        {'AttributeName': 'PK', 'KeyType': 'HASH'},
+        {'AttributeName': 'SK', 'KeyType': 'RANGE'}
+    ]
+    dynamodb_client.create_table(
+        TableName=MAIN_TABLE,
+        KeySchema=key_schema,
+        AttributeDefinitions=[
+            {'AttributeName': 'PK', 'AttributeType': 'S'},
+            {'AttributeName': 'SK', 'AttributeType': 'S'},
+            {'AttributeName': 'user_sub', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexes=[{
+            'IndexName': USER_SUB_INDEX,
+            'KeySchema': [{'AttributeName': 'user_sub', 'KeyType': 'HASH'}],
+            'Projection': {'ProjectionType': 'ALL'}
+        }],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    dynamodb_client.create_table(
+        TableName=ORDERS_TABLE,
+        KeySchema=key_schema,
+        AttributeDefinitions=[
+            {'AttributeName': 'PK', 'AttributeType': 'S'},
+            {'AttributeName': 'SK', 'AttributeType': 'S'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def seed_user(dynamodb_resource, user_id, cognito_sub, order_count=0):
+    """one user item plus order_count synthetic orders"""
+    from decimal import Decimal
+    from utils.order_ids import generate_order_id
+
+    dynamodb_resource.Table(MAIN_TABLE).put_item(Item={
+        'PK': user_id,
+        'SK': 'user',
+        'sub': cognito_sub,
+        'user_sub': cognito_sub,
+        'email': f"{cognito_sub}@example.com"
+    })
+
+    with dynamodb_resource.Table(ORDERS_TABLE).batch_writer() as batch:
+        for i in range(order_count):
+            order_id = generate_order_id()
+            price = Decimal('149.75') + i % 100
+            batch.put_item(Item={
+                'PK': user_id,
+                'SK': order_id,
+                'user_id': user_id,
+                'order_id': order_id,
+                'item_name': f"item {i}",
+                'quantity': i % 5 + 1,
+                'price_per_item': price,
+                'total_price': price * (i % 5 + 1),
+                'currency': 'PHP',
+                'status': 'pending',
+                'created_at': '2025-08-04T10:15:30.123456'
+            })
@@ -0,0 +1,156 @@
+"""
+cold start measurement for the client_backend handlers
+
+    python benchmarks/measure_cold_start.py [--handlers get_orders create_order]
+
+for every handler, in fresh python processes:
+1. import breakdown (python -X importtime): total handler import time and which
+   heavy packages (boto3, botocore, jose, cryptography) get imported at all
+2. cold start timeline against local stand-ins (moto + local jwks server), with and
+   without PRIME_ON_INIT: init (module import + priming), first request, warm request
+
+moto itself imports boto3 before the handler, so boto3's import cost shows up in
+part 1 only; part 2 shows where the remaining first-request work lands.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+HANDLERS_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'app', 'handlers', 'http')
+WATCHED_PACKAGES = ['boto3', 'botocore', 'jose', 'cryptography']
+# what the services import on first use (or while priming) instead of at module import
+DEFERRED_IMPORTS = 'import boto3, cryptography.hazmat.primitives.asymmetric.rsa, jose.jwt'
+
+
+def _importtime(statement):
+    """module -> timings for one statement run under -X importtime in a clean interpreter"""
+    env = dict(os.environ, MAIN_TABLE='bench-main', ORDERS_TABLE='bench-orders',
+               AWS_DEFAULT_REGION='ap-southeast-2', PRIME_ON_INIT='false')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=HANDLERS_DIR, env=env, capture_output=True, text=True, check=True
+    )
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, raw_name = line[len('import time:'):].split('|')
+        name = raw_name.strip()
+        modules[name] = {
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000,
+            'top_level': raw_name[1:2] != ' '  # nested imports are indented
+        }
+    return modules
+
+
+def import_breakdown(handler_name):
+    """summarize what importing a handler costs and what it pulls in"""
+    modules = _importtime(f"import {handler_name}")
+    deferred = _importtime(DEFERRED_IMPORTS)
+
+    slowest = sorted(
+        ((name, timing['self_ms']) for name, timing in modules.items()),
+        key=lambda item: item[1], reverse=True
+    )[:10]
+
+    return {
+        'handler_import_ms': round(modules.get(handler_name, {}).get('cumulative_ms', 0), 2),
+        'heavy_packages_imported': {
+            package: round(modules[package]['cumulative_ms'], 2) if package in modules else None
+            for package in WATCHED_PACKAGES
+        },
+        'slowest_modules_self_ms': {name: round(ms, 2) for name, ms in slowest},
+        'deferred_to_first_use_ms': {
+            name: round(timing['cumulative_ms'], 2)
+            for name, timing in deferred.items() if timing['top_level'] and name.split('.')[0] in WATCHED_PACKAGES
+        }
+    }
+
+
+def run_child(handler_name, warm_requests):
+    """(child process) stand-ins up, then time init / first / warm requests"""
+    from fixtures import LocalJWKSServer, SigningKey, configure_aws_env, configure_cognito_env, create_tables, seed_user
+
+    import boto3
+    from moto import mock_aws
+
+    signing_key = SigningKey()
+    configure_aws_env()
+
+    with LocalJWKSServer([signing_key]) as jwks_server, mock_aws():
+        configure_cognito_env(jwks_server.url)
+        create_tables(boto3.client('dynamodb'))
+        seed_user(boto3.resource('dynamodb'), 'user-cold', 'sub-cold', order_count=20)
+
+        event = {'headers': {'Authorization': f"Bearer {signing_key.mint_id_token('sub-cold')}"}}
+        if handler_name == 'create_order':
+            event['body'] = json.dumps({'item_name': 'cold start', 'quantity': 1, 'price_per_item': 10})
+
+        sys.path.insert(0, HANDLERS_DIR)
+        started = time.perf_counter()
+        handler_module = __import__(handler_name)
+        init_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        response = handler_module.handler(event, None)
+        first_ms = (time.perf_counter() - started) * 1000
+        assert response['statusCode'] == 200, response
+
+        warm = []
+        for _ in range(warm_requests):
+            started = time.perf_counter()
+            handler_module.handler(event, None)
+            warm.append((time.perf_counter() - started) * 1000)
+
+        return {
+            'init_ms': round(init_ms, 2),
+            'first_request_ms': round(first_ms, 2),
+            'warm_request_ms': round(sorted(warm)[len(warm) // 2], 2) if warm else None,
+            'jwks_downloads': jwks_server.request_count
+        }
+
+
+def timeline(handler_name, prime, warm_requests):
+    """spawn a fresh interpreter for one cold start"""
+    env = dict(os.environ, PRIME_ON_INIT='true' if prime else 'false')
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', handler_name, '--warm-requests', str(warm_requests)],
+        cwd=BENCH_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--handlers', nargs='+', default=['get_orders', 'create_order'])
+    parser.add_argument('--warm-requests', type=int, default=5)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # only the json line goes to stdout; the app's own prints would get mixed in otherwise
+        real_stdout = sys.stdout
+        sys.stdout = sys.stderr
+        result = run_child(args.child, args.warm_requests)
+        real_stdout.write(json.dumps(result) + '\n')
+        return
+
+    report = {}
+    for handler_name in args.handlers:
+        report[handler_name] = {
+            'imports': import_breakdown(handler_name),
+            'lazy_init': timeline(handler_name, prime=False, warm_requests=args.warm_requests),
+            'primed_init': timeline(handler_name, prime=True, warm_requests=args.warm_requests)
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
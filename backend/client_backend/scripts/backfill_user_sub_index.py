@@ -0,0 +1,145 @@
+"""
+backfill the sparse `user_sub` attribute that the sub -> user gsi is keyed on
+
+    python scripts/backfill_user_sub_index.py [--dry-run] [--checkpoint FILE]
+    python scripts/backfill_user_sub_index.py --verify
+
+backfill: scans the main table page by page and copies `sub` into `user_sub` on
+every user item (SK = user) that doesn't have it yet. the last processed page is
+checkpointed after each page, so an interrupted run picks up where it stopped.
+
+verify: checks every user item can be found through the gsi. once it reports no
+misses, USER_LOOKUP_SCAN_ON_MISS can be turned off and USER_LOOKUP_MODE switched
+from auto to gsi.
+"""
+import os
+import sys
+import json
+import argparse
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+from services.aws.dynamodb_service import DynamoDBService, USER_SUB_ATTRIBUTE
+
+
+def _load_checkpoint(path):
+    """last evaluated key from a previous run, if any"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('last_evaluated_key')
+
+
+def _save_checkpoint(path, last_evaluated_key, stats):
+    """record progress after each page"""
+    if not path:
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'last_evaluated_key': last_evaluated_key, 'stats': stats}, f)
+
+
+def _scan_user_pages(table, filter_expression, start_key, page_size):
+    """yield (items, last_evaluated_key) for each scan page"""
+    scan_kwargs = {'FilterExpression': filter_expression, 'Limit': page_size}
+    if start_key:
+        scan_kwargs['ExclusiveStartKey'] = start_key
+
+    while True:
+        response = table.scan(**scan_kwargs)
+        last_key = response.get('LastEvaluatedKey')
+        yield response.get('Items', []), last_key
+        if not last_key:
+            return
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
+
+def backfill(service, checkpoint_path, page_size, dry_run):
+    """copy sub into the index attribute on user items missing it"""
+    table = service.main_table
+    start_key = _load_checkpoint(checkpoint_path)
+    if start_key:
+        print(f"resuming from checkpoint {start_key}")
+
+    stats = {'pages': 0, 'updated': 0, 'skipped': 0}
+    filter_expression = (
+        Attr('SK').eq('user') & Attr('sub').exists() & Attr(USER_SUB_ATTRIBUTE).not_exists()
+    )
+
+    for items, last_key in _scan_user_pages(table, filter_expression, start_key, page_size):
+        for item in items:
+            if dry_run:
+                stats['updated'] += 1
+                continue
+            try:
+                table.update_item(
+                    Key={'PK': item['PK'], 'SK': item['SK']},
+                    UpdateExpression='SET #user_sub = :sub',
+                    # don't resurrect deleted users or clobber a value written concurrently
+                    ConditionExpression='attribute_exists(PK) AND attribute_not_exists(#user_sub)',
+                    ExpressionAttributeNames={'#user_sub': USER_SUB_ATTRIBUTE},
+                    ExpressionAttributeValues={':sub': item['sub']}
+                )
+                stats['updated'] += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                stats['skipped'] += 1
+
+        stats['pages'] += 1
+        if not dry_run:
+            _save_checkpoint(checkpoint_path, last_key, stats)
+        print(f"page {stats['pages']}: {stats['updated']} updated, {stats['skipped']} skipped")
+
+    if checkpoint_path and os.path.exists(checkpoint_path) and not dry_run:
+        os.remove(checkpoint_path)  # finished - next run starts fresh
+    return stats
+
+
+def verify(service, page_size):
+    """check every user item is reachable through the gsi"""
+    stats = {'users': 0, 'missing_attribute': 0, 'not_in_index': 0}
+
+    for items, _ in _scan_user_pages(service.main_table, Attr('SK').eq('user'), None, page_size):
+        for item in items:
+            stats['users'] += 1
+            if item.get(USER_SUB_ATTRIBUTE) != item.get('sub'):
+                stats['missing_attribute'] += 1
+                print(f"missing {USER_SUB_ATTRIBUTE}: {item['PK']}")
+                continue
+
+            response = service.main_table.query(
+                IndexName=service.user_sub_index,
+                KeyConditionExpression=Key(USER_SUB_ATTRIBUTE).eq(item['sub'])
+            )
+            if not any(found['PK'] == item['PK'] for found in response.get('Items', [])):
+                # gsis are eventually consistent, so a fresh backfill can lag a little
+                stats['not_in_index'] += 1
+                print(f"not in index yet: {item['PK']}")
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--verify', action='store_true', help='check gsi coverage instead of writing')
+    parser.add_argument('--dry-run', action='store_true', help='count items that would be updated')
+    parser.add_argument('--checkpoint', default='.user_sub_backfill.json', help='resume file for backfill')
+    parser.add_argument('--page-size', type=int, default=500, help='items evaluated per scan page')
+    args = parser.parse_args()
+
+    service = DynamoDBService()
+    print(f"table {service.main_table_name}, index {service.user_sub_index}")
+
+    if args.verify:
+        stats = verify(service, args.page_size)
+        print(json.dumps(stats))
+        sys.exit(0 if stats['missing_attribute'] == 0 and stats['not_in_index'] == 0 else 1)
+
+    print(json.dumps(backfill(service, args.checkpoint, args.page_size, args.dry_run)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+export every order in the orders table as ndjson or csv, to a local directory or s3
+
+    python scripts/export_orders.py DESTINATION [--format ndjson|csv] [--segments 8]
+                                    [--workers N] [--fields user_id,order_id,...]
+                                    [--checkpoint FILE] [--part-size-mb 8]
+
+DESTINATION is a directory or s3://bucket/prefix. the table is read with a parallel
+scan (--segments segments, --workers at a time); each segment is streamed into its own
+shard, part-00003-of-00008.ndjson etc, so the table is never held in memory. s3 shards
+are written with multipart uploads.
+
+progress is checkpointed per segment (LastEvaluatedKey plus the shard's bytes/parts)
+to --checkpoint, default DESTINATION-checkpoint.json next to a local destination or
+./export-checkpoint.json for s3. run the same command again to resume an interrupted
+export; delete the checkpoint to start over.
+"""
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+from services.aws.dynamodb_service import DynamoDBService
+from services.exports.order_export import EXPORT_FORMATS, OrderExporter, destination_for
+
+
+def _default_checkpoint(destination):
+    if destination.startswith('s3://'):
+        return 'export-checkpoint.json'
+    return f"{destination.rstrip(os.sep)}-checkpoint.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('destination', help='local directory or s3://bucket/prefix')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson')
+    parser.add_argument('--segments', type=int, default=8, help='parallel scan segments (= output shards)')
+    parser.add_argument('--workers', type=int, help='segments scanned at once (default: all)')
+    parser.add_argument('--page-size', type=int, default=1000, help='items evaluated per scan page')
+    parser.add_argument('--fields', help='comma separated attributes to export (default: all)')
+    parser.add_argument('--checkpoint', help='progress file (see above for the default)')
+    parser.add_argument('--part-size-mb', type=int, default=8, help='s3 multipart part size (min 5)')
+    args = parser.parse_args()
+
+    # one pooled connection per scanning worker (read when the transport is built, on first use)
+    os.environ.setdefault('DDB_MAX_POOL_CONNECTIONS', str(args.workers or args.segments))
+
+    fields = [field.strip() for field in args.fields.split(',') if field.strip()] if args.fields else None
+    exporter = OrderExporter(
+        DynamoDBService(),
+        destination_for(args.destination, part_size=args.part_size_mb * 1024 * 1024),
+        export_format=args.format,
+        total_segments=args.segments,
+        workers=args.workers,
+        page_size=args.page_size,
+        fields=fields,
+        checkpoint_path=args.checkpoint or _default_checkpoint(args.destination)
+    )
+    print(json.dumps(exporter.run(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+recompute the per-user order summary items (SK = summary) from the orders themselves
+
+    python scripts/rebuild_order_summaries.py [--user USER_ID ...] [--dry-run]
+
+without --user the whole orders table is scanned (only order items, only the
+attributes the summary needs) and every user's summary is rewritten. with --user
+only those users' partitions are queried.
+
+summaries are overwritten, so an order written for a user while their summary is
+being rebuilt can be missed - run it in a quiet period, or re-run for the users
+that were active.
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Key
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+from services.aws.dynamodb_service import DynamoDBService, ORDER_SUMMARY_SK, total_spend_attribute
+
+
+class SummaryBuilder:
+    """running aggregate for one user"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.order_count = 0
+        self.spend_by_currency = {}
+        self.last_order_id = None
+        self.last_order_at = None
+
+    def add(self, order):
+        self.order_count += 1
+        currency = order.get('currency', 'PHP')
+        amount = Decimal(str(order.get('total_price', 0)))
+        self.spend_by_currency[currency] = self.spend_by_currency.get(currency, Decimal('0')) + amount
+        # order ids break ties between orders created in the same millisecond
+        newest = (order.get('created_at') or '', order.get('order_id') or '')
+        if self.last_order_at is None or newest > (self.last_order_at, self.last_order_id):
+            self.last_order_at, self.last_order_id = newest
+
+    def item(self):
+        summary = {
+            'PK': self.user_id,
+            'SK': ORDER_SUMMARY_SK,
+            'order_count': self.order_count,
+            'updated_at': datetime.now().isoformat()
+        }
+        for currency, amount in self.spend_by_currency.items():
+            summary[total_spend_attribute(currency)] = amount
+        if self.last_order_at is not None:
+            summary['last_order_at'] = self.last_order_at
+            summary['last_order_id'] = self.last_order_id
+        return summary
+
+
+def _scan_orders(service, page_size):
+    """yield every order item in the table (summary and other non-order items skipped)"""
+    scan_kwargs = {
+        'FilterExpression': Key('SK').begins_with('order'),
+        'ProjectionExpression': 'PK, SK, order_id, currency, total_price, created_at',
+        'Limit': page_size
+    }
+    while True:
+        response = service.orders_table.scan(**scan_kwargs)
+        yield from response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
+
+def rebuild(service, user_ids, page_size, dry_run):
+    """recompute and write summaries, returns stats"""
+    builders = {}
+    if user_ids:
+        for user_id in user_ids:
+            builders[user_id] = SummaryBuilder(user_id)
+            for order in service.query_orders_by_user(user_id):
+                builders[user_id].add(order)
+    else:
+        for order in _scan_orders(service, page_size):
+            builder = builders.get(order['PK'])
+            if builder is None:
+                builder = builders[order['PK']] = SummaryBuilder(order['PK'])
+            builder.add(order)
+
+    stats = {'users': 0, 'orders': 0}
+    for builder in builders.values():
+        stats['users'] += 1
+        stats['orders'] += builder.order_count
+        if dry_run:
+            print(json.dumps(builder.item(), default=str))
+            continue
+        service.put_order_summary(builder.item())
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user', action='append', dest='users', help='only rebuild this user (repeatable)')
+    parser.add_argument('--dry-run', action='store_true', help='print the summaries instead of writing them')
+    parser.add_argument('--page-size', type=int, default=1000, help='items evaluated per scan page')
+    args = parser.parse_args()
+
+    service = DynamoDBService()
+    print(f"table {service.orders_table_name}")
+    print(json.dumps(rebuild(service, args.users, args.page_size, args.dry_run)))
+
+
+if __name__ == '__main__':
+    main()